@@ -0,0 +1,55 @@
+class AccountAliases:
+    """
+    Union-find over account identifiers, used to resolve merged-away
+    accounts to the account that absorbed them.
+
+    Sets are joined by size with path compression, so resolution is
+    effectively O(1) amortized however many rounds of merges have
+    happened. Because the larger set's root may belong to the merged-away
+    account, every root carries the label of the account that survives.
+    """
+
+    def __init__(self):
+        self.parent = {}  # node -> parent node (roots are absent)
+        self.size = {}  # root -> number of nodes in its set
+        self.label = {}  # root -> surviving account_id (when not the root itself)
+        self.root_of = {}  # surviving account_id -> root (when not itself)
+        # Off while snapshots read the structure as of an earlier moment:
+        # then parent links are only ever added, never rewritten
+        self.compress_paths = True
+
+    def _root(self, node):
+        root = node
+        while root in self.parent:
+            root = self.parent[root]
+        if self.compress_paths:
+            while node != root:
+                self.parent[node], node = root, self.parent[node]
+        return root
+
+    def root(self, account_id):
+        # Root of the set of a current (unmerged) account_id
+        return self.root_of.get(account_id, account_id)
+
+    def find(self, account_id):
+        if account_id not in self.parent:
+            return self.label.get(account_id, account_id)
+        root = self._root(account_id)
+        return self.label.get(root, root)
+
+    def union(self, survivor_id, merged_id):
+        # Both arguments must be current (unmerged) account identifiers
+        root1 = self.root_of.pop(survivor_id, survivor_id)
+        root2 = self.root_of.pop(merged_id, merged_id)
+        size1 = self.size.pop(root1, 1)
+        size2 = self.size.pop(root2, 1)
+        if size1 < size2:
+            root1, root2 = root2, root1
+        self.parent[root2] = root1
+        self.label.pop(root2, None)
+        self.size[root1] = size1 + size2
+        if root1 == survivor_id:
+            self.label.pop(root1, None)
+        else:
+            self.label[root1] = survivor_id
+            self.root_of[survivor_id] = root1
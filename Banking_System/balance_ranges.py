@@ -0,0 +1,74 @@
+from bisect import bisect_right
+import math
+
+
+class BalanceRangeIndex:
+    """
+    Range queries over one account's balance history, given as the
+    parallel `times` / `balances` columns the engine appends to.
+
+    A segment tree keeps the minimum and maximum of every range of
+    entries, and `areas[i]` holds the integral of the balance over time
+    up to entry `i`, so extremes and time-weighted averages of any time
+    range take O(log n). `extend` indexes entries appended since the last
+    call in O(log n) each; the tree doubles its capacity when it is full.
+    """
+
+    def __init__(self, times, balances):
+        self.times = times
+        self.balances = balances
+        self.size = 0
+        self.capacity = 1
+        self.mins = [math.inf] * 2  # node i covers children 2i and 2i + 1; leaves start at capacity
+        self.maxes = [-math.inf] * 2
+        self.areas = []  # areas[i] = sum of balances[j] * (times[j + 1] - times[j]) for j < i
+        self.extend()
+
+    def _grow(self):
+        capacity = self.capacity * 2
+        mins = [math.inf] * capacity + self.mins[self.capacity:] + [math.inf] * self.capacity
+        maxes = [-math.inf] * capacity + self.maxes[self.capacity:] + [-math.inf] * self.capacity
+        for node in range(capacity - 1, 0, -1):
+            mins[node] = min(mins[2 * node], mins[2 * node + 1])
+            maxes[node] = max(maxes[2 * node], maxes[2 * node + 1])
+        self.capacity, self.mins, self.maxes = capacity, mins, maxes
+
+    def extend(self):
+        times, balances, mins, maxes = self.times, self.balances, self.mins, self.maxes
+        for i in range(self.size, len(times)):
+            if i == self.capacity:
+                self._grow()
+                mins, maxes = self.mins, self.maxes
+            balance = balances[i]
+            node = self.capacity + i
+            mins[node] = maxes[node] = balance
+            node //= 2
+            while node:
+                mins[node] = min(mins[2 * node], mins[2 * node + 1])
+                maxes[node] = max(maxes[2 * node], maxes[2 * node + 1])
+                node //= 2
+            self.areas.append(self.areas[-1] + balances[i - 1] * (times[i] - times[i - 1]) if i else 0)
+        self.size = len(times)
+
+    def extremes(self, lo, hi):
+        # (min, max) of balances[lo:hi], hi > lo
+        minimum, maximum = math.inf, -math.inf
+        lo += self.capacity
+        hi += self.capacity
+        while lo < hi:
+            if lo & 1:
+                minimum, maximum = min(minimum, self.mins[lo]), max(maximum, self.maxes[lo])
+                lo += 1
+            if hi & 1:
+                hi -= 1
+                minimum, maximum = min(minimum, self.mins[hi]), max(maximum, self.maxes[hi])
+            lo //= 2
+            hi //= 2
+        return minimum, maximum
+
+    def area(self, end):
+        # Sum of the balance at every millisecond before end
+        index = bisect_right(self.times, end - 1, 0, self.size) - 1
+        if index < 0:
+            return 0
+        return self.areas[index] + self.balances[index] * (end - self.times[index])
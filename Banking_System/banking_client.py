@@ -0,0 +1,137 @@
+"""
+asyncio client for `banking_server.BankingServer`.
+
+    client = await BankingClient.connect("127.0.0.1", 8765, pool_size=4)
+    await client.create_account(1, "account1")
+    await client.execute_batch([("deposit", 2, "account1", 100), ("top_spenders", 3, 1)])
+    await client.close()
+"""
+import asyncio
+import itertools
+import json
+
+
+class BankingServerError(Exception):
+    """
+    The server rejected a request (unknown operation or bad arguments).
+    """
+
+
+class _Connection:
+    # One pipelined connection: requests are written as they come and responses
+    # are matched to their futures by id
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.pending = {}  # request id -> future
+        self.ids = itertools.count()
+        self.listener = asyncio.create_task(self._read_responses())
+
+    async def _read_responses(self):
+        try:
+            while line := await self.reader.readline():
+                response = json.loads(line)
+                future = self.pending.pop(response["id"], None)
+                if future is None or future.done():
+                    continue
+                if "error" in response:
+                    future.set_exception(BankingServerError(response["error"]))
+                else:
+                    future.set_result(response["result"])
+        except ConnectionError:
+            pass
+        finally:
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("connection to the banking server closed"))
+            self.pending.clear()
+
+    def send(self, op, args):
+        request_id = next(self.ids)
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        self.writer.write(json.dumps({"id": request_id, "op": op, "args": args}).encode() + b"\n")
+        return future
+
+    async def close(self):
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
+        await self.listener
+
+
+class BankingClient:
+    """
+    Async `BankingSystem` client over a pool of pipelined connections.
+
+    Each call goes to the connection with the fewest requests in flight.
+    Calls on different connections may reach the server in any order, so
+    await calls whose order matters, or send them together through
+    `execute_batch`, which pipelines them on one connection.
+    """
+
+    def __init__(self, connections):
+        self.connections = connections
+
+    @classmethod
+    async def connect(cls, host="127.0.0.1", port=8765, pool_size=4):
+        connections = []
+        for _ in range(pool_size):
+            reader, writer = await asyncio.open_connection(host, port)
+            connections.append(_Connection(reader, writer))
+        return cls(connections)
+
+    async def close(self):
+        for connection in self.connections:
+            await connection.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def _connection(self):
+        return min(self.connections, key=lambda connection: len(connection.pending))
+
+    async def call(self, op, timestamp, *args):
+        connection = self._connection()
+        future = connection.send(op, [timestamp, *args])
+        await connection.writer.drain()
+        return await future
+
+    async def execute_batch(self, commands):
+        connection = self._connection()
+        futures = [connection.send(op, [timestamp, *args]) for op, timestamp, *args in commands]
+        await connection.writer.drain()
+        return list(await asyncio.gather(*futures))
+
+    async def create_account(self, timestamp, account_id):
+        return await self.call("create_account", timestamp, account_id)
+
+    async def deposit(self, timestamp, account_id, amount):
+        return await self.call("deposit", timestamp, account_id, amount)
+
+    async def transfer(self, timestamp, source_account_id, target_account_id, amount):
+        return await self.call("transfer", timestamp, source_account_id, target_account_id, amount)
+
+    async def top_spenders(self, timestamp, n):
+        return await self.call("top_spenders", timestamp, n)
+
+    async def pay(self, timestamp, account_id, amount):
+        return await self.call("pay", timestamp, account_id, amount)
+
+    async def get_payment_status(self, timestamp, account_id, payment):
+        return await self.call("get_payment_status", timestamp, account_id, payment)
+
+    async def merge_accounts(self, timestamp, account_id_1, account_id_2):
+        return await self.call("merge_accounts", timestamp, account_id_1, account_id_2)
+
+    async def get_balance(self, timestamp, account_id, time_at):
+        return await self.call("get_balance", timestamp, account_id, time_at)
+
+    async def get_balance_stats(self, timestamp, account_id, time_from, time_to):
+        return await self.call("get_balance_stats", timestamp, account_id, time_from, time_to)
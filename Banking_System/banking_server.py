@@ -0,0 +1,189 @@
+"""
+asyncio TCP front-end sharing one `BankingSystem` between many clients.
+
+The protocol is line-delimited JSON. A request is
+`{"id": <any>, "op": "<method name>", "args": [timestamp, ...]}` and the
+response to it is `{"id": <same id>, "result": ...}` or
+`{"id": <same id>, "error": "<message>"}`. Clients may pipeline requests;
+responses on a connection come back in request order.
+
+Run locally with:
+
+    python banking_server.py --host 127.0.0.1 --port 8765
+"""
+from banking_system_impl import BankingSystemImpl
+import argparse
+import asyncio
+import json
+
+# op -> argument types, timestamp first
+SIGNATURES = {
+    "create_account": (int, str),
+    "deposit": (int, str, int),
+    "transfer": (int, str, str, int),
+    "top_spenders": (int, int),
+    "pay": (int, str, int),
+    "get_payment_status": (int, str, str),
+    "merge_accounts": (int, str, str),
+    "get_balance": (int, str, int),
+    "get_balance_stats": (int, str, int, int),
+}
+
+
+def check_request(request):
+    # Returns an error message, or None if the request can be executed
+    if not isinstance(request, dict):
+        return "request must be a JSON object"
+    op, args = request.get("op"), request.get("args")
+    if op not in SIGNATURES:
+        return f"unknown operation: {op!r}"
+    types = SIGNATURES[op]
+    if not isinstance(args, list) or len(args) != len(types):
+        return f"{op} takes {len(types)} arguments"
+    for arg, expected in zip(args, types):
+        # bool is an int subclass but never a valid argument
+        if type(arg) is not expected:
+            return f"{op} expects arguments of types {', '.join(t.__name__ for t in types)}"
+    return None
+
+
+class BankingServer:
+    """
+    Serves one `BankingSystem` over TCP.
+
+    Requests from all connections go into one queue in arrival order. The
+    engine task takes everything queued so far (up to `max_batch`
+    requests) and runs it as a single `execute_batch` call, so requests
+    that arrive together, typically at the same timestamp, settle
+    cashbacks once and share the call overhead.
+    """
+
+    def __init__(self, system=None, host="127.0.0.1", port=8765, max_batch=1024):
+        self.system = system if system is not None else BankingSystemImpl()
+        self.host = host
+        self.port = port
+        self.max_batch = max_batch
+        self._queue = None
+        self._server = None
+        self._engine = None
+        self._writers = set()  # connections not closed yet
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._server = await asyncio.start_server(self._serve_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]  # resolves port=0
+        self._engine = asyncio.create_task(self._run_engine())
+
+    async def serve_forever(self):
+        await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        self._server.close()
+        self._engine.cancel()
+        try:
+            await self._engine
+        except asyncio.CancelledError:
+            pass
+        for writer in self._writers:
+            writer.close()
+        self._writers.clear()
+        await self._server.wait_closed()
+
+    async def _serve_connection(self, reader, writer):
+        self._writers.add(writer)
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # Longer than the reader's limit: the rest of the stream
+                    # cannot be split into requests reliably, so stop reading
+                    await self._queue.put((None, None, "request line too long", writer))
+                    break
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    request = None
+                error = check_request(request)
+                request_id = request.get("id") if isinstance(request, dict) else None
+                if error is not None:
+                    # Goes through the queue too, to keep responses in request order
+                    await self._queue.put((None, request_id, error, writer))
+                else:
+                    await self._queue.put(((request["op"], *request["args"]), request_id, None, writer))
+        except ConnectionError:
+            pass
+        finally:
+            # The engine closes the writer once everything queued before this
+            # has been answered (error None without a command marks it)
+            self._queue.put_nowait((None, None, None, writer))
+
+    def _execute(self, commands):
+        # Result, or the exception raised, of each command. A command that
+        # raises fails alone: the engine reports the results of the commands
+        # before it (as `batch_results`) and the rest run as a new batch.
+        outcomes = []
+        while commands:
+            try:
+                return outcomes + self.system.execute_batch(commands)
+            except Exception as error:
+                done = getattr(error, "batch_results", None)
+                if done is None:
+                    # No telling which commands were applied, so none can be retried
+                    return outcomes + [error] * len(commands)
+                outcomes += done
+                outcomes.append(error)
+                commands = commands[len(done) + 1:]
+        return outcomes
+
+    async def _run_engine(self):
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            results = iter(self._execute([command for command, _, _, _ in batch if command is not None]))
+            writers, closing = set(), []
+            for command, request_id, error, writer in batch:
+                if command is None and error is None:
+                    closing.append(writer)
+                    continue
+                if command is None:
+                    response = {"id": request_id, "error": error}
+                else:
+                    result = next(results)
+                    if isinstance(result, Exception):
+                        response = {"id": request_id, "error": f"{type(result).__name__}: {result}"}
+                    else:
+                        response = {"id": request_id, "result": result}
+                if not writer.is_closing():
+                    writer.write(json.dumps(response).encode() + b"\n")
+                    writers.add(writer)
+            for writer in writers:
+                try:
+                    await writer.drain()
+                except ConnectionError:
+                    pass
+            for writer in closing:
+                writer.close()
+                self._writers.discard(writer)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a BankingSystemImpl over TCP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--max-batch", type=int, default=1024)
+    args = parser.parse_args()
+    server = BankingServer(host=args.host, port=args.port, max_batch=args.max_batch)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
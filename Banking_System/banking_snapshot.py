@@ -0,0 +1,137 @@
+from banking_system_impl import PAYMENT_STATUSES, parse_payment_id
+from bisect import bisect_right
+
+
+class BankingSnapshot:
+    """
+    Read-only view of a `BankingSystemImpl` as of the moment
+    `snapshot()` was called.
+
+    Taking one copies nothing per account, payment or merge. It reads the
+    live structures, and the system hands it the pre-image of everything
+    just before its first change after the snapshot, so a query reads the
+    live value of untouched state and the preserved one of changed state:
+      * the balance and history of an account. Histories only ever grow,
+      so the pre-image of a history is its column objects and their
+      length at the time;
+      * the status of a payment;
+      * the surviving account of each alias root a merge links under
+      another. While snapshots are open the system stops compressing
+      alias paths, so links are only ever added and a walk that stops at
+      those roots resolves ids as of the snapshot.
+    The ranking is frozen copy-on-write and payment owners are an
+    append-only column cut off at the snapshot's payment count.
+
+    Queries may run in another thread while a single writer thread keeps
+    operating on the system. Call `release` (or leave the `with` block)
+    when done so that writes stop preserving state for it.
+    """
+
+    def __init__(self, system):
+        self.accounts = system.accounts
+        self.history_times = system.history_times
+        self.history_balances = system.history_balances
+        # account_id -> (balance or None, history times, history balances, history length)
+        self.overlay = {}
+        self.aliases = system.aliases
+        self.alias_overlay = {}  # alias root a merge changed since -> surviving account_id then
+        self.ranking = system.ranking.freeze()
+        self.payment_owners = system.payment_owners
+        self.payment_counter = system.payment_counter
+        self.payment_statuses = system.payment_statuses
+        self.status_overlay = {}  # payment index -> status
+        self.released = False
+
+    def _preserve(self, account_ids, payments, merge):
+        # Called by the system before the first change to each of account_ids,
+        # to the statuses of payments and, if merge, to the alias roots of
+        # account_ids, which are about to be merged with each other
+        for account_id in account_ids:
+            if account_id not in self.overlay:
+                times = self.history_times.get(account_id)
+                self.overlay[account_id] = (self.accounts.get(account_id), times,
+                                            self.history_balances.get(account_id),
+                                            len(times) if times is not None else 0)
+            if merge:
+                root = self.aliases.root(account_id)
+                if root not in self.alias_overlay:
+                    self.alias_overlay[root] = self.aliases.label.get(root, root)
+        for index in payments:
+            if index < self.payment_counter and index not in self.status_overlay:
+                self.status_overlay[index] = self.payment_statuses[index]
+
+    def _find(self, account_id):
+        # The account account_id resolved to at the snapshot. Each live value
+        # is read before the overlay, which is filled before the change.
+        parent, label = self.aliases.parent, self.aliases.label
+        node = account_id
+        while True:
+            above = parent.get(node)
+            if above is None or node in self.alias_overlay:
+                break
+            node = above
+        survivor = label.get(node, node)
+        return self.alias_overlay.get(node, survivor)
+
+    def _account(self, account_id):
+        # (balance or None, times, balances, length) of account_id at the snapshot.
+        # Live values are read first: an id missing from the overlay afterwards
+        # had not changed yet when they were read.
+        balance = self.accounts.get(account_id)
+        times = self.history_times.get(account_id)
+        balances = self.history_balances.get(account_id)
+        length = len(times) if times is not None else 0
+        return self.overlay.get(account_id, (balance, times, balances, length))
+
+    def release(self):
+        self.released = True
+        self.overlay, self.alias_overlay, self.status_overlay = {}, {}, {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+    def balance(self, account_id):
+        """
+        Returns the balance of `account_id` (or of the account it was
+        merged into), or None if it did not exist.
+        """
+        return self._account(self._find(account_id))[0]
+
+    def get_balance(self, account_id, time_at):
+        """
+        Returns the balance `account_id` had at `time_at` as far as the
+        snapshot knows, or None, like `BankingSystem.get_balance`.
+        """
+        balance, times, balances, length = self._account(self._find(account_id))
+        if balance is None:
+            return None
+        index = bisect_right(times, time_at, 0, length)
+        if index == 0:
+            return None
+        return balances[index - 1]
+
+    def top_spenders(self, n):
+        """
+        Returns the `n` top spenders at the snapshot, formatted like
+        `BankingSystem.top_spenders`.
+        """
+        return [f"{acc}({amt})" for acc, amt in self.ranking.top(n)]
+
+    def get_payment_status(self, account_id, payment_id):
+        """
+        Returns the status of `payment_id` at the snapshot, or None, like
+        `BankingSystem.get_payment_status`.
+        """
+        account_id = self._find(account_id)
+        if self._account(account_id)[0] is None:
+            return None
+        index = parse_payment_id(payment_id)
+        if index is None or index >= self.payment_counter:
+            return None
+        if self._find(self.payment_owners[index]) != account_id:
+            return None
+        status = self.payment_statuses[index]
+        return PAYMENT_STATUSES[self.status_overlay.get(index, status)]
@@ -153,3 +153,46 @@ class BankingSystem(ABC):
         """
         # default implementation
         return None
+
+    def get_balance_stats(self, timestamp: int, account_id: str, time_from: int,
+                          time_to: int) -> tuple[int, int, float] | None:
+        """
+        Should return `(minimum, maximum, average)` of the balance of
+        `account_id` over the time range `[time_from, time_to]`.
+          * The minimum and maximum are taken over the balance in
+          effect at `time_from` and every balance recorded after it up
+          to `time_to`, including balances that only lasted until a
+          later operation with the same timestamp.
+          * The average is weighted by time: the mean of the balance at
+          each millisecond of the range, i.e. of `get_balance` at every
+          `time_at` in it.
+          * Only the part of the range after the account was created
+          counts. Returns `None` if the account did not exist at
+          `time_to` or `time_from > time_to`.
+          * If the account was merged into another account, the merged
+          account's history is included as in `get_balance`.
+        """
+        # default implementation
+        return None
+
+    def execute_batch(self, commands) -> list:
+        """
+        Should execute a list or iterator of commands, each a tuple
+        `(op, timestamp, *args)` where `op` is the name of one of the
+        operations above (e.g. `("deposit", 4, "account1", 1000)`),
+        in the given order, which must be non-decreasing by
+        `timestamp`.
+        Returns the list of results, identical to calling each
+        operation individually.
+        If a command raises, the commands before it stay applied and
+        the exception carries their results as `batch_results`.
+        """
+        # default implementation
+        results = []
+        try:
+            for op, timestamp, *args in commands:
+                results.append(getattr(self, op)(timestamp, *args))
+        except Exception as error:
+            error.batch_results = results
+            raise
+        return results
@@ -0,0 +1,179 @@
+from account_aliases import AccountAliases
+from banking_system_impl import BankingSystemImpl, CASHBACK_DELAY
+from spender_ranking import SpenderRanking
+from contextlib import contextmanager
+import threading
+
+
+class LockedSpenderRanking(SpenderRanking):
+    # SpenderRanking whose operations are atomic with respect to each other
+
+    def __init__(self, load=256):
+        super().__init__(load)
+        self.lock = threading.Lock()
+
+    def add(self, account_id, outgoing):
+        with self.lock:
+            super().add(account_id, outgoing)
+
+    def remove(self, account_id, outgoing):
+        with self.lock:
+            super().remove(account_id, outgoing)
+
+    def update(self, account_id, old_outgoing, new_outgoing):
+        with self.lock:
+            SpenderRanking.remove(self, account_id, old_outgoing)
+            SpenderRanking.add(self, account_id, new_outgoing)
+
+    def merge(self, survivor_id, merged_id, survivor_outgoing, merged_outgoing):
+        with self.lock:
+            SpenderRanking.remove(self, merged_id, merged_outgoing)
+            SpenderRanking.remove(self, survivor_id, survivor_outgoing)
+            SpenderRanking.add(self, survivor_id, survivor_outgoing + merged_outgoing)
+
+    def top(self, n):
+        with self.lock:
+            return super().top(n)
+
+    def freeze(self):
+        with self.lock:
+            return super().freeze()
+
+
+class LockedAccountAliases(AccountAliases):
+    # AccountAliases whose path compression and unions are atomic
+
+    def __init__(self):
+        super().__init__()
+        self.lock = threading.Lock()
+
+    def find(self, account_id):
+        with self.lock:
+            return super().find(account_id)
+
+    def union(self, survivor_id, merged_id):
+        with self.lock:
+            super().union(survivor_id, merged_id)
+
+
+class ConcurrentBankingSystem(BankingSystemImpl):
+    """
+    Thread-safe `BankingSystemImpl` where operations on different
+    accounts run in parallel.
+
+    Every operation locks the (alias-resolved) accounts it touches. Locks
+    are striped by account hash and always taken in stripe order, so
+    `transfer` and `merge_accounts` cannot deadlock. The ranking, alias
+    and payment structures shared by all accounts sit behind short
+    internal locks of their own.
+
+    Cashbacks wait in a queue per account and are settled under that
+    account's lock when an operation reaches their refund time. A thread
+    therefore never applies a refund to an account that another thread
+    still sees at an earlier timestamp. As long as the operations on each
+    account are issued in timestamp order, every result equals a serial
+    execution in timestamp order.
+    """
+
+    def __init__(self, lock_stripes=1024, **engine_options):
+        super().__init__(**engine_options)
+        self.ranking = LockedSpenderRanking()
+        self.aliases = LockedAccountAliases()
+        self._stripes = [threading.Lock() for _ in range(lock_stripes)]
+        self._payments_lock = threading.Lock()
+        self._snapshots_lock = threading.Lock()
+
+    @contextmanager
+    def _locked(self, timestamp, *account_ids):
+        # Locks the accounts the ids resolve to and settles their due cashbacks
+        while True:
+            resolved = {self._get_actual_id(account_id) for account_id in account_ids}
+            stripes = sorted({hash(account_id) % len(self._stripes) for account_id in resolved})
+            for stripe in stripes:
+                self._stripes[stripe].acquire()
+            # A merge may have redirected an id while we were waiting
+            if {self._get_actual_id(account_id) for account_id in account_ids} == resolved:
+                break
+            for stripe in reversed(stripes):
+                self._stripes[stripe].release()
+        try:
+            for account_id in resolved:
+                self._settle_account(account_id, timestamp)
+            yield
+        finally:
+            for stripe in reversed(stripes):
+                self._stripes[stripe].release()
+
+    def _settle(self, timestamp, *account_ids):
+        # Settled per account in _locked instead
+        pass
+
+    def _process_cashbacks(self, timestamp):
+        # execute_batch settles through here; a global pass would refund
+        # accounts without their locks and ahead of their own timestamps
+        pass
+
+    def snapshot(self, timestamp=None):
+        # Holding every stripe waits out the operations in flight, and
+        # writers preserve state for the snapshot under their own locks
+        for stripe in self._stripes:
+            stripe.acquire()
+        try:
+            if timestamp is not None:
+                for account_id in list(self.account_cashbacks):
+                    self._settle_account(account_id, timestamp)
+            return super().snapshot()
+        finally:
+            for stripe in reversed(self._stripes):
+                stripe.release()
+
+    def _preserve(self, *account_ids, payments=(), merge=False):
+        # Writers on different accounts preserve at the same time, and each
+        # prunes the list of open snapshots
+        with self._snapshots_lock:
+            super()._preserve(*account_ids, payments=payments, merge=merge)
+
+    def _record_payment(self, timestamp, account_id, amount):
+        with self._payments_lock:
+            index = self.payment_counter
+            self.payment_counter += 1
+            self.payment_owners.append(account_id)
+            self.payment_times.append(timestamp)
+            self.payment_amounts.append(amount)
+            self.payment_statuses.append(0)
+        # The caller holds the lock of account_id
+        self.account_cashbacks[account_id].append((timestamp + CASHBACK_DELAY, index))
+        return f"payment{index + 1}"
+
+    def create_account(self, timestamp, account_id):
+        with self._locked(timestamp, account_id):
+            return super().create_account(timestamp, account_id)
+
+    def _deposit(self, timestamp, account_id, amount):
+        with self._locked(timestamp, account_id):
+            return super()._deposit(timestamp, account_id, amount)
+
+    def _transfer(self, timestamp, source_id, target_id, amount):
+        with self._locked(timestamp, source_id, target_id):
+            return super()._transfer(timestamp, source_id, target_id, amount)
+
+    def _pay(self, timestamp, account_id, amount):
+        with self._locked(timestamp, account_id):
+            return super()._pay(timestamp, account_id, amount)
+
+    def _get_payment_status(self, timestamp, account_id, payment_id):
+        with self._locked(timestamp, account_id):
+            return super()._get_payment_status(timestamp, account_id, payment_id)
+
+    def _merge_accounts(self, timestamp, id1, id2):
+        with self._locked(timestamp, id1, id2):
+            id1, id2 = self._get_actual_id(id1), self._get_actual_id(id2)
+            return super()._merge_accounts(timestamp, id1, id2)
+
+    def _get_balance(self, timestamp, account_id, time_at):
+        with self._locked(timestamp, account_id):
+            return super()._get_balance(timestamp, account_id, time_at)
+
+    def _get_balance_stats(self, timestamp, account_id, time_from, time_to):
+        with self._locked(timestamp, account_id):
+            return super()._get_balance_stats(timestamp, account_id, time_from, time_to)
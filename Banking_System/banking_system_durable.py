@@ -0,0 +1,182 @@
+from banking_system_impl import BankingSystemImpl
+import mmap
+import os
+import pickle
+import struct
+
+RECORD_HEADER = struct.Struct("<I")  # length of the pickled record that follows
+SNAPSHOT_PREFIX, SNAPSHOT_SUFFIX = "snapshot-", ".bin"
+WAL_PREFIX, WAL_SUFFIX = "wal-", ".log"
+
+
+def _file_name(prefix, sequence, suffix):
+    # zero-padded so names sort in sequence order
+    return f"{prefix}{sequence:020d}{suffix}"
+
+
+def _sequences(directory, prefix, suffix):
+    # sorted sequence numbers of the files named <prefix><sequence><suffix>
+    sequences = []
+    for name in os.listdir(directory):
+        if name.startswith(prefix) and name.endswith(suffix):
+            digits = name[len(prefix):-len(suffix)]
+            if digits.isdigit():
+                sequences.append(int(digits))
+    return sorted(sequences)
+
+
+def read_wal(path):
+    """
+    Returns the `(op, timestamp, args)` records of a write-ahead log
+    segment and the byte offset just past the last complete record, so a
+    record torn by a crash mid-write can be truncated away.
+    """
+    records = []
+    with open(path, "rb") as f:
+        data = f.read()
+    offset = 0
+    while offset + RECORD_HEADER.size <= len(data):
+        (length,) = RECORD_HEADER.unpack_from(data, offset)
+        end = offset + RECORD_HEADER.size + length
+        if end > len(data):
+            break
+        records.append(pickle.loads(data[offset + RECORD_HEADER.size:end]))
+        offset = end
+    return records, offset
+
+
+class DurableBankingSystem(BankingSystemImpl):
+    """
+    `BankingSystemImpl` that survives restarts.
+
+    Every accepted state change (successful `create_account`, `deposit`,
+    `transfer`, `pay` and `merge_accounts`) is appended to a write-ahead
+    log before its result is returned. Every `snapshot_every` records the
+    whole engine state is written to a binary snapshot and a new log
+    segment is started, so recovery loads the latest snapshot and replays
+    only the log tail.
+
+    Rejected operations and queries are not logged: they change no state
+    apart from settling due cashbacks, and settling again on replay gives
+    the same balances, history and payment statuses.
+    """
+
+    def __init__(self, directory, snapshot_every=100000, sync=False, **engine_options):
+        super().__init__(**engine_options)
+        self._directory = directory
+        self._snapshot_every = snapshot_every
+        self._sync = sync  # fsync every record, not just flush it to the OS
+        self._wal = None
+        self._sequence = 0  # number of records logged since the system was created
+        self._snapshot_sequence = 0
+        os.makedirs(directory, exist_ok=True)
+        self._recover()
+
+    def _path(self, prefix, sequence, suffix):
+        return os.path.join(self._directory, _file_name(prefix, sequence, suffix))
+
+    def _recover(self):
+        snapshots = _sequences(self._directory, SNAPSHOT_PREFIX, SNAPSHOT_SUFFIX)
+        if snapshots:
+            self._load_snapshot(self._path(SNAPSHOT_PREFIX, snapshots[-1], SNAPSHOT_SUFFIX))
+            self._sequence = self._snapshot_sequence = snapshots[-1]
+
+        # Replay the tail; self._wal is still None, so nothing is re-logged
+        segments = [s for s in _sequences(self._directory, WAL_PREFIX, WAL_SUFFIX)
+                    if s >= self._snapshot_sequence]
+        end = 0
+        for start in segments:
+            records, end = read_wal(self._path(WAL_PREFIX, start, WAL_SUFFIX))
+            for op, timestamp, args in records[self._sequence - start:]:
+                getattr(self, op)(timestamp, *args)
+                self._sequence += 1
+
+        if segments:
+            path = self._path(WAL_PREFIX, segments[-1], WAL_SUFFIX)
+            self._wal = open(path, "r+b")
+            self._wal.truncate(end)  # drop a torn final record
+            self._wal.seek(end)
+        else:
+            self._wal = open(self._path(WAL_PREFIX, self._sequence, WAL_SUFFIX), "wb")
+
+    def _load_snapshot(self, path):
+        with open(path, "rb") as f:
+            try:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    state = pickle.loads(data)
+            except (OSError, ValueError):
+                # mmap is unavailable on some file systems
+                f.seek(0)
+                state = pickle.load(f)
+        self.__dict__.update(state)
+
+    def _log(self, op, timestamp, args):
+        if self._wal is None:
+            return
+        record = pickle.dumps((op, timestamp, args), protocol=pickle.HIGHEST_PROTOCOL)
+        self._wal.write(RECORD_HEADER.pack(len(record)) + record)
+        self._wal.flush()
+        if self._sync:
+            os.fsync(self._wal.fileno())
+        self._sequence += 1
+        if self._sequence - self._snapshot_sequence >= self._snapshot_every:
+            self.checkpoint()
+
+    def checkpoint(self):
+        """
+        Writes a snapshot of the current state, starts a new log segment
+        and removes the snapshots and segments it makes obsolete.
+        """
+        # Engine state is every public attribute; durability bookkeeping is private
+        state = {key: value for key, value in vars(self).items() if not key.startswith("_")}
+        path = self._path(SNAPSHOT_PREFIX, self._sequence, SNAPSHOT_SUFFIX)
+        with open(path + ".tmp", "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+
+        self._wal.close()
+        self._wal = open(self._path(WAL_PREFIX, self._sequence, WAL_SUFFIX), "wb")
+        self._snapshot_sequence = self._sequence
+        for sequence in _sequences(self._directory, SNAPSHOT_PREFIX, SNAPSHOT_SUFFIX):
+            if sequence < self._sequence:
+                os.remove(self._path(SNAPSHOT_PREFIX, sequence, SNAPSHOT_SUFFIX))
+        for sequence in _sequences(self._directory, WAL_PREFIX, WAL_SUFFIX):
+            if sequence < self._sequence:
+                os.remove(self._path(WAL_PREFIX, sequence, WAL_SUFFIX))
+
+    def close(self):
+        if self._wal is not None:
+            self._wal.close()
+            self._wal = None
+
+    def create_account(self, timestamp, account_id):
+        result = super().create_account(timestamp, account_id)
+        if result:
+            self._log("create_account", timestamp, (account_id,))
+        return result
+
+    def _deposit(self, timestamp, account_id, amount):
+        result = super()._deposit(timestamp, account_id, amount)
+        if result is not None:
+            self._log("deposit", timestamp, (account_id, amount))
+        return result
+
+    def _transfer(self, timestamp, source_id, target_id, amount):
+        result = super()._transfer(timestamp, source_id, target_id, amount)
+        if result is not None:
+            self._log("transfer", timestamp, (source_id, target_id, amount))
+        return result
+
+    def _pay(self, timestamp, account_id, amount):
+        result = super()._pay(timestamp, account_id, amount)
+        if result is not None:
+            self._log("pay", timestamp, (account_id, amount))
+        return result
+
+    def _merge_accounts(self, timestamp, id1, id2):
+        result = super()._merge_accounts(timestamp, id1, id2)
+        if result:
+            self._log("merge_accounts", timestamp, (id1, id2))
+        return result
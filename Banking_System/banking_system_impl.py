@@ -1,168 +1,417 @@
+from account_aliases import AccountAliases
+from balance_ranges import BalanceRangeIndex
 from banking_system import BankingSystem
+from spender_ranking import SpenderRanking
+from array import array
+from bisect import bisect_right
 from collections import defaultdict, deque
+from functools import partial
+import heapq
 import math
+import weakref
 
 CASHBACK_DELAY = 86400000  # 24 hours in milliseconds
+INT64_MIN, INT64_MAX = -2 ** 63, 2 ** 63 - 1  # range of the array("q") payment columns
+PAYMENT_STATUSES = ("IN_PROGRESS", "CASHBACK_RECEIVED")
+
+# history_backend -> factory for one column of a balance history
+HISTORY_BACKENDS = {
+    "list": list,  # Python ints, ~80 bytes per (timestamp, balance) entry
+    "array": partial(array, "q"),  # packed int64 columns, 16 bytes per entry
+}
+
+# "eager" settles every due cashback before each operation; "lazy" settles an
+# account's cashbacks only when an operation touches it, and all of them at
+# top_spenders
+CASHBACK_SETTLEMENTS = ("eager", "lazy")
+
+def parse_payment_id(payment_id):
+    # "payment<n>" -> index n - 1, or None if payment_id is not of that form
+    digits = payment_id[7:] if payment_id.startswith("payment") else ""
+    if not (digits.isascii() and digits.isdigit()) or digits[0] == "0":
+        return None
+    return int(digits) - 1
 
 class BankingSystemImpl(BankingSystem):
-    def __init__(self):
+    def __init__(self, history_backend="list", cashback_settlement="eager"):
+        if history_backend not in HISTORY_BACKENDS:
+            raise ValueError(f"unknown history backend: {history_backend!r}")
+        if cashback_settlement not in CASHBACK_SETTLEMENTS:
+            raise ValueError(f"unknown cashback settlement: {cashback_settlement!r}")
+        self.new_column = HISTORY_BACKENDS[history_backend]
+        self.int64_history = history_backend == "array"
+        self.lazy_settlement = cashback_settlement == "lazy"
         self.accounts = {}  # account_id -> balance
         self.outgoing = defaultdict(int)  # account_id -> total outgoing
-        self.history = defaultdict(list)  # account_id -> [(timestamp, balance)]
-        self.payments = {}  # payment_id -> (account_id, timestamp, amount, status)
-        self.pending_cashbacks = []  # (timestamp_to_refund, account_id, amount, payment_id)
+        self.ranking = SpenderRanking()  # live accounts ordered by (-outgoing, account_id)
+        # account_id -> parallel timestamp / balance lists, sorted by timestamp
+        self.history_times = defaultdict(self.new_column)
+        self.history_balances = defaultdict(self.new_column)
+        self.balance_ranges = {}  # account_id -> BalanceRangeIndex, built on first get_balance_stats
+        # Payment columns indexed by ordinal - 1 ("payment1" is index 0)
+        self.payment_owners = []  # account_id that made the payment (append-only, snapshots share it)
+        self.payment_times = array("q")
+        self.payment_amounts = array("q")
+        self.payment_statuses = bytearray()  # index into PAYMENT_STATUSES
+        # Refunds fall due CASHBACK_DELAY after their payment and payments come in
+        # timestamp order, so pending refunds are exactly the payments from this
+        # index on: scheduling one is free and settling walks forward
+        self.next_refund = 0
+        # account_id -> deque of (timestamp_to_refund, payment_index), lazy settlement only
+        self.account_cashbacks = defaultdict(deque)
         self.payment_counter = 0
-        self.merged = {}  # old_id -> new_id (for merged accounts)
-        self.payment_lookup = defaultdict(dict)  # account_id -> {payment_id -> actual_id}
+        self.aliases = AccountAliases()  # merged-away account_id -> surviving account_id
+        self._snapshots = []  # weak references to open BankingSnapshots
 
     def _get_actual_id(self, account_id):
-        while account_id in self.merged:
-            account_id = self.merged[account_id]
-        return account_id
+        return self.aliases.find(account_id)
 
     def _record_history(self, account_id, timestamp):
-        balance = self.accounts[account_id]
-        self.history[account_id].append((timestamp, balance))
+        # Cashbacks are settled before every other operation, so entries always
+        # arrive in timestamp order and a plain append keeps the lists sorted
+        self.history_times[account_id].append(timestamp)
+        self.history_balances[account_id].append(self.accounts[account_id])
 
-    def _process_cashbacks(self, timestamp):
-        new_pending = []
-        for refund_time, acct, amt, pay_id in self.pending_cashbacks:
-            acct = self._get_actual_id(acct)
-            if refund_time <= timestamp:
-                if acct in self.accounts:
-                    self.accounts[acct] += amt
-                    self._record_history(acct, refund_time)
-                    if pay_id in self.payments:
-                        self.payments[pay_id] = (acct, refund_time, amt, "CASHBACK_RECEIVED")
+    def _check_history(self, timestamp, *balances):
+        # The array backend stores history entries as int64; checked before
+        # any state changes, so an operation is never half recorded
+        if not (INT64_MIN <= timestamp <= INT64_MAX and all(INT64_MIN <= b <= INT64_MAX for b in balances)):
+            raise ValueError("balance history timestamps and balances must fit in 64-bit integers")
+
+    def _add_outgoing(self, account_id, amount):
+        old = self.outgoing[account_id]
+        self.outgoing[account_id] = old + amount
+        self.ranking.update(account_id, old, old + amount)
+
+    def _merge_history(self, id1, id2):
+        # Both histories are already sorted, so merge them in one pass;
+        # on equal timestamps entries of id1 come first
+        times1, balances1 = self.history_times[id1], self.history_balances[id1]
+        times2, balances2 = self.history_times[id2], self.history_balances[id2]
+        if not times2 or (times1 and times1[-1] <= times2[0]):
+            times1.extend(times2)
+            balances1.extend(balances2)
+            return
+        if not times1 or times2[-1] < times1[0]:
+            times2.extend(times1)
+            balances2.extend(balances1)
+            self.history_times[id1], self.history_balances[id1] = times2, balances2
+            return
+        times, balances = self.new_column(), self.new_column()
+        i = j = 0
+        while i < len(times1) and j < len(times2):
+            if times2[j] < times1[i]:
+                times.append(times2[j])
+                balances.append(balances2[j])
+                j += 1
             else:
-                new_pending.append((refund_time, acct, amt, pay_id))
-        self.pending_cashbacks = new_pending
+                times.append(times1[i])
+                balances.append(balances1[i])
+                i += 1
+        times.extend(times1[i:])
+        balances.extend(balances1[i:])
+        times.extend(times2[j:])
+        balances.extend(balances2[j:])
+        self.history_times[id1], self.history_balances[id1] = times, balances
+
+    def _process_cashbacks(self, timestamp):
+        # Refund every payment made at or before timestamp - CASHBACK_DELAY, in
+        # payment order. Under lazy settlement some were already refunded
+        # through their account.
+        index, due = self.next_refund, timestamp - CASHBACK_DELAY
+        times, statuses = self.payment_times, self.payment_statuses
+        while index < self.payment_counter and times[index] <= due:
+            if not statuses[index]:
+                self._refund(times[index] + CASHBACK_DELAY, index)
+            index += 1
+        self.next_refund = index
+
+    def _settle_account(self, account_id, timestamp):
+        queue = self.account_cashbacks.get(account_id)
+        while queue and queue[0][0] <= timestamp:
+            refund_time, index = queue[0]
+            if not self.payment_statuses[index]:
+                self._refund(refund_time, index)
+            queue.popleft()  # only once refunded, in case _refund raises
+
+    def _settle(self, timestamp, *account_ids):
+        # Settles the cashbacks an operation on account_ids can observe
+        if not self.lazy_settlement or not account_ids:
+            self._process_cashbacks(timestamp)
+            return
+        for account_id in account_ids:
+            self._settle_account(self._get_actual_id(account_id), timestamp)
+
+    def _refund(self, refund_time, index):
+        acct = self._get_actual_id(self.payment_owners[index])
+        if acct in self.accounts:
+            cashback = self.payment_amounts[index] * 2 // 100  # 2% cashback rounded down
+            if self.int64_history:
+                self._check_history(refund_time, self.accounts[acct] + cashback)
+            if self._snapshots:
+                self._preserve(acct, payments=(index,))
+            self.accounts[acct] += cashback
+            self._record_history(acct, refund_time)
+            self.payment_statuses[index] = 1
+
+    def _preserve(self, *account_ids, payments=(), merge=False):
+        # Called before account_ids (merged with each other if merge) and the
+        # statuses of payments change: open snapshots keep their old state
+        open_snapshots = []
+        for reference in self._snapshots:
+            snapshot = reference()
+            if snapshot is not None and not snapshot.released:
+                snapshot._preserve(account_ids, payments, merge)
+                open_snapshots.append(reference)
+        self._snapshots = open_snapshots
+        if not open_snapshots:
+            self.aliases.compress_paths = True
+
+    def snapshot(self, timestamp=None):
+        """
+        Returns a read-only `BankingSnapshot` of the current state, after
+        settling the cashbacks due at `timestamp` if one is given. It can
+        be queried from another thread while operations continue here.
+        """
+        from banking_snapshot import BankingSnapshot  # imports this module
+        if timestamp is not None:
+            self._settle(timestamp)
+        snapshot = BankingSnapshot(self)
+        self._snapshots.append(weakref.ref(snapshot))
+        self.aliases.compress_paths = False
+        return snapshot
+
+    def _record_payment(self, timestamp, account_id, amount):
+        index = self.payment_counter
+        self.payment_counter += 1
+        self.payment_owners.append(account_id)
+        self.payment_times.append(timestamp)
+        self.payment_amounts.append(amount)
+        self.payment_statuses.append(0)
+        if self.lazy_settlement:
+            self.account_cashbacks[account_id].append((timestamp + CASHBACK_DELAY, index))
+        return f"payment{self.payment_counter}"
+
+    def _payment_index(self, payment_id):
+        # "payment<n>" -> column index, or None if no such payment was issued
+        index = parse_payment_id(payment_id)
+        return index if index is not None and index < self.payment_counter else None
+
+    def _batch_handlers(self):
+        # op name -> operation body, which runs without settling cashbacks
+        return {
+            "create_account": self.create_account,
+            "deposit": self._deposit,
+            "transfer": self._transfer,
+            "pay": self._pay,
+            "get_payment_status": self._get_payment_status,
+            "top_spenders": self._top_spenders,
+            "merge_accounts": self._merge_accounts,
+            "get_balance": self._get_balance,
+            "get_balance_stats": self._get_balance_stats,
+        }
+
+    def execute_batch(self, commands):
+        # Cashbacks are settled once per distinct timestamp, then every
+        # operation runs its body directly
+        handlers = self._batch_handlers()
+        results = []
+        try:
+            if self.lazy_settlement:
+                # Each public method settles just the accounts it touches
+                for op, timestamp, *args in commands:
+                    if op not in handlers:
+                        raise ValueError(f"unknown operation: {op!r}")
+                    results.append(getattr(self, op)(timestamp, *args))
+                return results
+            settled_at = None
+            for op, timestamp, *args in commands:
+                handler = handlers.get(op)
+                if handler is None:
+                    raise ValueError(f"unknown operation: {op!r}")
+                if timestamp != settled_at:
+                    self._process_cashbacks(timestamp)
+                    settled_at = timestamp
+                results.append(handler(timestamp, *args))
+            return results
+        except Exception as error:
+            error.batch_results = results
+            raise
 
     def create_account(self, timestamp, account_id):
         account_id = self._get_actual_id(account_id)
         if account_id in self.accounts:
             return False
+        if self.int64_history:
+            self._check_history(timestamp, 0)
+        if self._snapshots:
+            self._preserve(account_id)
         self.accounts[account_id] = 0
         self._record_history(account_id, timestamp)
+        self.ranking.add(account_id, 0)
         return True
 
     def deposit(self, timestamp, account_id, amount):
-        self._process_cashbacks(timestamp)
+        self._settle(timestamp, account_id)
+        return self._deposit(timestamp, account_id, amount)
+
+    def _deposit(self, timestamp, account_id, amount):
         account_id = self._get_actual_id(account_id)
         if account_id not in self.accounts:
             return None
+        if self.int64_history:
+            self._check_history(timestamp, self.accounts[account_id] + amount)
+        if self._snapshots:
+            self._preserve(account_id)
         self.accounts[account_id] += amount
         self._record_history(account_id, timestamp)
         return self.accounts[account_id]
 
     def transfer(self, timestamp, source_id, target_id, amount):
-        self._process_cashbacks(timestamp)
+        self._settle(timestamp, source_id, target_id)
+        return self._transfer(timestamp, source_id, target_id, amount)
+
+    def _transfer(self, timestamp, source_id, target_id, amount):
         source_id = self._get_actual_id(source_id)
         target_id = self._get_actual_id(target_id)
         if source_id == target_id or source_id not in self.accounts or target_id not in self.accounts:
             return None
         if self.accounts[source_id] < amount:
             return None
+        if self.int64_history:
+            self._check_history(timestamp, self.accounts[source_id] - amount, self.accounts[target_id] + amount)
+        if self._snapshots:
+            self._preserve(source_id, target_id)
         self.accounts[source_id] -= amount
         self.accounts[target_id] += amount
-        self.outgoing[source_id] += amount
+        self._add_outgoing(source_id, amount)
         self._record_history(source_id, timestamp)
         self._record_history(target_id, timestamp)
         return self.accounts[source_id]
 
     def pay(self, timestamp, account_id, amount):
-        self._process_cashbacks(timestamp)
+        self._settle(timestamp, account_id)
+        return self._pay(timestamp, account_id, amount)
+
+    def _pay(self, timestamp, account_id, amount):
         account_id = self._get_actual_id(account_id)
         if account_id not in self.accounts or self.accounts[account_id] < amount:
             return None
+        # Checked before any state changes, so a payment is never half recorded
+        if not (INT64_MIN <= timestamp <= INT64_MAX and INT64_MIN <= amount <= INT64_MAX):
+            raise ValueError("payment timestamp and amount must fit in 64-bit integers")
+        if self.int64_history:
+            self._check_history(timestamp, self.accounts[account_id] - amount)
+        if self._snapshots:
+            self._preserve(account_id)
         self.accounts[account_id] -= amount
         self._record_history(account_id, timestamp)
-        self.outgoing[account_id] += amount
-
-        cashback = amount * 2 // 100  # 2% cashback rounded down
-        cashback_time = timestamp + CASHBACK_DELAY
-        self.payment_counter += 1
-        payment_id = f"payment{self.payment_counter}"
-        self.payments[payment_id] = (account_id, timestamp, amount, "IN_PROGRESS")
-        self.pending_cashbacks.append((cashback_time, account_id, cashback, payment_id))
-        self.payment_lookup[account_id][payment_id] = payment_id
-        return payment_id
+        self._add_outgoing(account_id, amount)
+        return self._record_payment(timestamp, account_id, amount)
 
     def get_payment_status(self, timestamp, account_id, payment_id):
-        self._process_cashbacks(timestamp)
+        self._settle(timestamp, account_id)
+        return self._get_payment_status(timestamp, account_id, payment_id)
+
+    def _get_payment_status(self, timestamp, account_id, payment_id):
         actual_id = self._get_actual_id(account_id)
         if actual_id not in self.accounts:
             return None
-        actual_payment = self.payment_lookup.get(actual_id, {}).get(payment_id, payment_id)
-        if actual_payment not in self.payments:
+        index = self._payment_index(payment_id)
+        if index is None:
             return None
-        payment_owner, _, _, status = self.payments[actual_payment]
-        if self._get_actual_id(payment_owner) != actual_id:
+        # Payments of merged-away accounts resolve to their new owner through
+        # the alias structure, so merges never copy payment ownership
+        if self._get_actual_id(self.payment_owners[index]) != actual_id:
             return None
-        return status
+        return PAYMENT_STATUSES[self.payment_statuses[index]]
 
     def top_spenders(self, timestamp, n):
-        self._process_cashbacks(timestamp)
-        spenders = []
-        for acc_id in self.accounts:
-            real_id = self._get_actual_id(acc_id)
-            if real_id != acc_id:
-                continue  # skip merged-away accounts
-            total = self.outgoing.get(real_id, 0)
-            spenders.append((real_id, total))
-        # sort: descending by amount, ascending by account_id
-        spenders.sort(key=lambda x: (-x[1], x[0]))
-        result = []
-        for i in range(min(n, len(spenders))):
-            acc, amt = spenders[i]
-            result.append(f"{acc}({amt})")
-        return result
+        self._settle(timestamp)
+        return self._top_spenders(timestamp, n)
+
+    def _top_spenders(self, timestamp, n):
+        # ranking is ordered descending by amount, ascending by account_id
+        return [f"{acc}({amt})" for acc, amt in self.ranking.top(n)]
 
     def merge_accounts(self, timestamp, id1, id2):
-        self._process_cashbacks(timestamp)
+        self._settle(timestamp, id1, id2)
+        return self._merge_accounts(timestamp, id1, id2)
+
+    def _merge_accounts(self, timestamp, id1, id2):
         id1 = self._get_actual_id(id1)
         id2 = self._get_actual_id(id2)
         if id1 == id2 or id1 not in self.accounts or id2 not in self.accounts:
             return False
+        if self.int64_history:
+            self._check_history(timestamp, self.accounts[id1] + self.accounts[id2])
+        if self._snapshots:
+            self._preserve(id1, id2, merge=True)
+
+        # Redirect history (before recording the merge so that entry stays last)
+        self._merge_history(id1, id2)
 
         # Merge balances
         self.accounts[id1] += self.accounts[id2]
         self._record_history(id1, timestamp)
 
         # Merge outgoing totals
-        self.outgoing[id1] += self.outgoing[id2]
-
-        # Redirect history
-        for ts, bal in self.history[id2]:
-            self.history[id1].append((ts, bal))
-        self.history[id1].sort()
+        outgoing1, outgoing2 = self.outgoing[id1], self.outgoing[id2]
+        self.outgoing[id1] = outgoing1 + outgoing2
+        self.ranking.merge(id1, id2, outgoing1, outgoing2)
 
         # Update merged map
-        self.merged[id2] = id1
-
-        # Transfer payment mappings
-        for pid in self.payment_lookup.get(id2, {}):
-            self.payment_lookup[id1][pid] = pid
+        self.aliases.union(id1, id2)
 
         # Cleanup
         del self.accounts[id2]
         if id2 in self.outgoing:
             del self.outgoing[id2]
-        if id2 in self.history:
-            del self.history[id2]
-        if id2 in self.payment_lookup:
-            del self.payment_lookup[id2]
+        self.history_times.pop(id2, None)
+        self.history_balances.pop(id2, None)
+        self.balance_ranges.pop(id2, None)
+        queue2 = self.account_cashbacks.pop(id2, None)
+        if queue2:
+            queue1 = self.account_cashbacks.get(id1)
+            self.account_cashbacks[id1] = deque(heapq.merge(queue1, queue2)) if queue1 else queue2
         return True
 
     def get_balance(self, timestamp, account_id, time_at):
-        self._process_cashbacks(timestamp)
+        self._settle(timestamp, account_id)
+        return self._get_balance(timestamp, account_id, time_at)
+
+    def _get_balance(self, timestamp, account_id, time_at):
         account_id = self._get_actual_id(account_id)
-        if account_id not in self.history:
+        if account_id not in self.history_times:
             return None
-        balance_at = None
-        for ts, bal in self.history[account_id]:
-            if ts <= time_at:
-                balance_at = bal
-            else:
-                break
-        return balance_at
+        # Last entry at or before time_at, i.e. the state after queries at time_at
+        index = bisect_right(self.history_times[account_id], time_at)
+        if index == 0:
+            return None
+        return self.history_balances[account_id][index - 1]
+
+    def get_balance_stats(self, timestamp, account_id, time_from, time_to):
+        self._settle(timestamp, account_id)
+        return self._get_balance_stats(timestamp, account_id, time_from, time_to)
+
+    def _get_balance_stats(self, timestamp, account_id, time_from, time_to):
+        account_id = self._get_actual_id(account_id)
+        if account_id not in self.history_times or time_from > time_to:
+            return None
+        times = self.history_times[account_id]
+        index = self.balance_ranges.get(account_id)
+        # Merges and migrations replace the history columns, so an index
+        # built over other column objects is rebuilt; appends are caught up
+        if index is None or index.times is not times:
+            index = self.balance_ranges[account_id] = BalanceRangeIndex(times, self.history_balances[account_id])
+        else:
+            index.extend()
+        end = bisect_right(times, time_to)
+        if end == 0:
+            return None
+        # The entry in force at time_from, then every entry up to time_to
+        start = max(bisect_right(times, time_from) - 1, 0)
+        minimum, maximum = index.extremes(start, end)
+        time_from = max(time_from, times[0])
+        average = (index.area(time_to + 1) - index.area(time_from)) / (time_to + 1 - time_from)
+        return minimum, maximum, average
@@ -0,0 +1,392 @@
+from account_aliases import AccountAliases
+from banking_system import BankingSystem
+from banking_system_impl import BankingSystemImpl, CASHBACK_DELAY
+from collections import defaultdict, deque
+import heapq
+import multiprocessing
+import os
+import zlib
+
+
+def shard_of(account_id, shards):
+    # Stable across processes, unlike hash()
+    return zlib.crc32(account_id.encode()) % shards
+
+
+class ShardEngine(BankingSystemImpl):
+    """
+    `BankingSystemImpl` running inside one shard worker, with the
+    primitives the coordinator uses for cross-shard operations.
+    """
+
+    def __init__(self, **engine_options):
+        super().__init__(**engine_options)
+        if self.lazy_settlement:
+            raise ValueError("shard engines settle cashbacks per batch timestamp (eager settlement)")
+        self.account_payments = defaultdict(list)  # account_id -> local payment indices
+        # Imported payments are older than the local ones around them, so their
+        # refunds wait in a min-heap of (timestamp_to_refund, payment_index)
+        self.imported_cashbacks = []
+
+    def _batch_handlers(self):
+        handlers = super()._batch_handlers()
+        handlers.update({
+            "debit": self._debit,
+            "credit": self._deposit,
+            "export_account": self._export_account,
+            "import_account": self._import_account,
+            "top": self._top,
+        })
+        return handlers
+
+    def _process_cashbacks(self, timestamp):
+        imported = self.imported_cashbacks
+        while imported and imported[0][0] <= timestamp:
+            # Local refunds due first go first, so histories stay sorted
+            super()._process_cashbacks(imported[0][0])
+            refund_time, index = heapq.heappop(imported)
+            if not self.payment_statuses[index]:
+                self._refund(refund_time, index)
+        super()._process_cashbacks(timestamp)
+
+    def _record_payment(self, timestamp, account_id, amount):
+        payment_id = super()._record_payment(timestamp, account_id, amount)
+        self.account_payments[account_id].append(self.payment_counter - 1)
+        return payment_id
+
+    def _merge_accounts(self, timestamp, id1, id2):
+        id1, id2 = self._get_actual_id(id1), self._get_actual_id(id2)
+        if not super()._merge_accounts(timestamp, id1, id2):
+            return False
+        # Move the smaller payment list into the larger one
+        payments1 = self.account_payments.pop(id1, [])
+        payments2 = self.account_payments.pop(id2, [])
+        if len(payments1) < len(payments2):
+            payments1, payments2 = payments2, payments1
+        payments1.extend(payments2)
+        if payments1:
+            self.account_payments[id1] = payments1
+        return True
+
+    def _debit(self, timestamp, account_id, amount):
+        # Source half of a cross-shard transfer; the coordinator checked the target
+        if account_id not in self.accounts or self.accounts[account_id] < amount:
+            return None
+        self.accounts[account_id] -= amount
+        self._add_outgoing(account_id, amount)
+        self._record_history(account_id, timestamp)
+        return self.accounts[account_id]
+
+    def _export_account(self, timestamp, account_id):
+        # Removes the merged-away side of a cross-shard merge and returns its state.
+        # Its refunds left behind are skipped once the account is gone.
+        outgoing = self.outgoing.pop(account_id, 0)
+        self.ranking.remove(account_id, outgoing)
+        self.balance_ranges.pop(account_id, None)
+        return {
+            "balance": self.accounts.pop(account_id),
+            "outgoing": outgoing,
+            "history_times": self.history_times.pop(account_id),
+            "history_balances": self.history_balances.pop(account_id),
+            "payments": [(index, self.payment_times[index], self.payment_amounts[index],
+                          self.payment_statuses[index])
+                         for index in self.account_payments.pop(account_id, [])],
+        }
+
+    def _import_account(self, timestamp, id1, id2, state):
+        # Recreates an exported account as id2 and merges it into id1.
+        # Returns the new local indices of its payments, in export order.
+        self.accounts[id2] = state["balance"]
+        self.outgoing[id2] = state["outgoing"]
+        self.ranking.add(id2, state["outgoing"])
+        self.history_times[id2] = self.new_column(state["history_times"])
+        self.history_balances[id2] = self.new_column(state["history_balances"])
+        indices = []
+        for _, paid_at, amount, status in state["payments"]:
+            index = self.payment_counter
+            self.payment_counter += 1
+            self.payment_owners.append(id2)
+            self.payment_times.append(paid_at)
+            self.payment_amounts.append(amount)
+            self.payment_statuses.append(status)
+            if not status:
+                heapq.heappush(self.imported_cashbacks, (paid_at + CASHBACK_DELAY, index))
+            indices.append(index)
+        self.account_payments[id2] = list(indices)
+        self._merge_accounts(timestamp, id1, id2)
+        return indices
+
+    def _top(self, timestamp, n):
+        return self.ranking.top(n)
+
+
+def _serve_shard(connection, engine_options):
+    engine = ShardEngine(**engine_options)
+    while True:
+        commands = connection.recv()
+        if commands is None:
+            break
+        connection.send(engine.execute_batch(commands))
+    connection.close()
+
+
+class _Step:
+    # One command for one shard. A step with `after` waits for that step and
+    # then builds its command from the result (None means skip the step).
+    __slots__ = ("command", "after", "on_done", "done", "result")
+
+    def __init__(self, command, after=None, on_done=None):
+        self.command = command
+        self.after = after
+        self.on_done = on_done
+        self.done = False
+        self.result = None
+
+    def finish(self, result):
+        self.done = True
+        self.result = result
+        if self.on_done is not None:
+            self.on_done(result)
+
+
+class ShardedBankingSystem(BankingSystem):
+    """
+    `BankingSystem` hash-partitioning accounts over worker processes,
+    each running its own `ShardEngine`.
+
+    The coordinator owns the alias map, the set of live accounts and the
+    global payment numbering, so it knows the outcome of `create_account`
+    and `merge_accounts` and of operations on missing accounts without
+    asking a shard. Everything else becomes steps queued per shard, and
+    every round sends each shard the ready prefix of its queue, so shards
+    work in parallel.
+
+    A cross-shard `transfer` is two-phase: a debit on the source shard,
+    then a credit on the target shard that waits for the debit and is
+    dropped if it failed. A cross-shard `merge_accounts` exports the
+    merged-away account from its shard and imports it into the surviving
+    account's shard. `top_spenders` asks every shard for its top `n` and
+    merges the answers.
+    """
+
+    def __init__(self, workers=None, **engine_options):
+        self.shards = workers or os.cpu_count() or 1
+        self.aliases = AccountAliases()
+        self.live = set()  # accounts that exist and were not merged away
+        self.payments = []  # ordinal - 1 -> [shard, local_index]
+        self.payment_handles = {}  # (shard, local_index) -> entry of self.payments
+        self._connections = []
+        self._processes = []
+        for _ in range(self.shards):
+            connection, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_serve_shard, args=(child, engine_options), daemon=True)
+            process.start()
+            child.close()
+            self._connections.append(connection)
+            self._processes.append(process)
+
+    def close(self):
+        for connection in self._connections:
+            connection.send(None)
+            connection.close()
+        for process in self._processes:
+            process.join()
+        self._connections, self._processes = [], []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _shard(self, account_id):
+        return shard_of(account_id, self.shards)
+
+    def _run(self, queues):
+        # Rounds until every queue is empty; each round runs all ready prefixes in parallel
+        while any(queues):
+            sent = []
+            for shard, queue in enumerate(queues):
+                steps = []
+                while queue:
+                    step = queue[0]
+                    if step.after is not None:
+                        if not step.after.done:
+                            break
+                        step.command, step.after = step.command(step.after.result), None
+                        if step.command is None:
+                            queue.popleft().finish(None)
+                            continue
+                    steps.append(queue.popleft())
+                if steps:
+                    self._connections[shard].send([step.command for step in steps])
+                    sent.append((shard, steps))
+            for shard, steps in sent:
+                for step, result in zip(steps, self._connections[shard].recv()):
+                    step.finish(result)
+
+    def _register_payment(self, shard, step, holder):
+        # Makes the [shard, local_index] handle of a successful payment as soon as
+        # its shard answers, so a later cross-shard merge can move it
+        def on_done(result):
+            if result is not None:
+                handle = [shard, int(result[7:]) - 1]
+                self.payment_handles[tuple(handle)] = handle
+                holder.append(handle)
+        step.on_done = on_done
+
+    def _assign_payments(self, pays, results):
+        # Numbers finished payments in command order
+        while pays and pays[0][1].done:
+            index, _, holder = pays.popleft()
+            if holder:
+                self.payments.append(holder[0])
+                results[index] = f"payment{len(self.payments)}"
+
+    def _moved_payments(self, old_shard, new_shard, export_step):
+        def on_done(new_indices):
+            for (old_index, *_), new_index in zip(export_step.result["payments"], new_indices):
+                handle = self.payment_handles.pop((old_shard, old_index))
+                handle[0], handle[1] = new_shard, new_index
+                self.payment_handles[(new_shard, new_index)] = handle
+        return on_done
+
+    def execute_batch(self, commands):
+        results = []
+        queues = [deque() for _ in range(self.shards)]
+        pays = deque()  # (result index, step, [handle]) of payments not numbered yet
+        finalizers = []  # (result index, callable) run once all steps are done
+        moving = False  # a cross-shard merge is in flight
+
+        commands = list(commands)
+        try:
+            for index, command in enumerate(commands):
+                results.append(None)
+                op, timestamp, *args = command
+                if op == "create_account":
+                    account_id = self.aliases.find(args[0])
+                    if account_id not in self.live:
+                        self.live.add(account_id)
+                        queues[self._shard(account_id)].append(_Step(("create_account", timestamp, account_id)))
+                        results[index] = True
+                    else:
+                        results[index] = False
+                elif op in ("deposit", "pay", "get_balance", "get_balance_stats"):
+                    account_id = self.aliases.find(args[0])
+                    if account_id in self.live:
+                        shard = self._shard(account_id)
+                        step = _Step((op, timestamp, account_id, *args[1:]))
+                        queues[shard].append(step)
+                        if op == "pay":
+                            holder = []
+                            self._register_payment(shard, step, holder)
+                            pays.append((index, step, holder))
+                        else:
+                            finalizers.append((index, lambda step=step: step.result))
+                elif op == "transfer":
+                    source_id, target_id = self.aliases.find(args[0]), self.aliases.find(args[1])
+                    if source_id == target_id or source_id not in self.live or target_id not in self.live:
+                        continue
+                    source_shard, target_shard = self._shard(source_id), self._shard(target_id)
+                    if source_shard == target_shard:
+                        step = _Step(("transfer", timestamp, source_id, target_id, args[2]))
+                        queues[source_shard].append(step)
+                    else:
+                        step = _Step(("debit", timestamp, source_id, args[2]))
+                        queues[source_shard].append(step)
+                        queues[target_shard].append(_Step(
+                            lambda balance, timestamp=timestamp, target_id=target_id, amount=args[2]:
+                                None if balance is None else ("credit", timestamp, target_id, amount),
+                            after=step))
+                    finalizers.append((index, lambda step=step: step.result))
+                elif op == "merge_accounts":
+                    id1, id2 = self.aliases.find(args[0]), self.aliases.find(args[1])
+                    if id1 == id2 or id1 not in self.live or id2 not in self.live:
+                        results[index] = False
+                        continue
+                    shard1, shard2 = self._shard(id1), self._shard(id2)
+                    if shard1 == shard2:
+                        queues[shard1].append(_Step(("merge_accounts", timestamp, id1, id2)))
+                    else:
+                        export = _Step(("export_account", timestamp, id2))
+                        queues[shard2].append(export)
+                        queues[shard1].append(_Step(
+                            lambda state, timestamp=timestamp, id1=id1, id2=id2:
+                                ("import_account", timestamp, id1, id2, state),
+                            after=export, on_done=self._moved_payments(shard2, shard1, export)))
+                        moving = True
+                    self.aliases.union(id1, id2)
+                    self.live.discard(id2)
+                    results[index] = True
+                elif op == "get_payment_status":
+                    account_id = self.aliases.find(args[0])
+                    if account_id not in self.live:
+                        continue
+                    if pays or moving:
+                        # Payment numbering and ownership must be settled first
+                        self._run(queues)
+                        self._assign_payments(pays, results)
+                        moving = False
+                    payment_id = args[1]
+                    digits = payment_id[7:] if payment_id.startswith("payment") else ""
+                    if not (digits.isascii() and digits.isdigit()) or digits[0] == "0" \
+                            or int(digits) > len(self.payments):
+                        continue
+                    shard, local_index = self.payments[int(digits) - 1]
+                    if shard != self._shard(account_id):
+                        continue
+                    step = _Step(("get_payment_status", timestamp, account_id, f"payment{local_index + 1}"))
+                    queues[shard].append(step)
+                    finalizers.append((index, lambda step=step: step.result))
+                elif op == "top_spenders":
+                    n = max(args[0], 0)  # a negative n lists nobody, as in BankingSystemImpl
+                    steps = [_Step(("top", timestamp, n)) for _ in range(self.shards)]
+                    for queue, step in zip(queues, steps):
+                        queue.append(step)
+                    finalizers.append((index, lambda steps=steps, n=n: [
+                        f"{account_id}({outgoing})" for account_id, outgoing in heapq.merge(
+                            *(step.result for step in steps), key=lambda x: (-x[1], x[0]))][:n]))
+                else:
+                    raise ValueError(f"unknown operation: {op!r}")
+        except Exception as error:
+            # The commands before the failing one already changed live, aliases
+            # and payments, so they still run to keep the shards in step
+            del results[index:]
+            self._finish(queues, pays, [(i, f) for i, f in finalizers if i < index], results)
+            error.batch_results = results
+            raise
+        self._finish(queues, pays, finalizers, results)
+        return results
+
+    def _finish(self, queues, pays, finalizers, results):
+        self._run(queues)
+        self._assign_payments(pays, results)
+        for index, finalize in finalizers:
+            results[index] = finalize()
+
+    def create_account(self, timestamp, account_id):
+        return self.execute_batch([("create_account", timestamp, account_id)])[0]
+
+    def deposit(self, timestamp, account_id, amount):
+        return self.execute_batch([("deposit", timestamp, account_id, amount)])[0]
+
+    def transfer(self, timestamp, source_account_id, target_account_id, amount):
+        return self.execute_batch([("transfer", timestamp, source_account_id, target_account_id, amount)])[0]
+
+    def top_spenders(self, timestamp, n):
+        return self.execute_batch([("top_spenders", timestamp, n)])[0]
+
+    def pay(self, timestamp, account_id, amount):
+        return self.execute_batch([("pay", timestamp, account_id, amount)])[0]
+
+    def get_payment_status(self, timestamp, account_id, payment):
+        return self.execute_batch([("get_payment_status", timestamp, account_id, payment)])[0]
+
+    def merge_accounts(self, timestamp, account_id_1, account_id_2):
+        return self.execute_batch([("merge_accounts", timestamp, account_id_1, account_id_2)])[0]
+
+    def get_balance(self, timestamp, account_id, time_at):
+        return self.execute_batch([("get_balance", timestamp, account_id, time_at)])[0]
+
+    def get_balance_stats(self, timestamp, account_id, time_from, time_to):
+        return self.execute_batch([("get_balance_stats", timestamp, account_id, time_from, time_to)])[0]
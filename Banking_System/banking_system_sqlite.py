@@ -0,0 +1,384 @@
+from banking_system import BankingSystem
+from banking_system_impl import CASHBACK_DELAY, INT64_MAX, INT64_MIN, PAYMENT_STATUSES, parse_payment_id
+from collections import OrderedDict
+import sqlite3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS accounts (
+    account_id TEXT PRIMARY KEY,
+    balance INTEGER NOT NULL,
+    outgoing INTEGER NOT NULL,
+    next_rank INTEGER NOT NULL,  -- rank of the account's next history row
+    history_key TEXT NOT NULL,  -- account_id its history rows are stored under
+    first_rank INTEGER NOT NULL  -- its rows have the ranks first_rank .. next_rank - 1
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS accounts_by_outgoing ON accounts (outgoing DESC, account_id);
+
+-- Rows of one account are ordered by (timestamp, rank). A merge moves the
+-- smaller of the two histories under the other's key, re-ranked so that the
+-- survivor's rows come first on equal timestamps, as in BankingSystemImpl
+CREATE TABLE IF NOT EXISTS history (
+    account_id TEXT NOT NULL,
+    timestamp INTEGER NOT NULL,
+    rank INTEGER NOT NULL,
+    balance INTEGER NOT NULL,
+    PRIMARY KEY (account_id, timestamp, rank)
+) WITHOUT ROWID;
+
+-- payment_index is "payment<n>" - 1; refunds fall due in payment_index order
+CREATE TABLE IF NOT EXISTS payments (
+    payment_index INTEGER PRIMARY KEY,
+    account_id TEXT NOT NULL,  -- account that made the payment
+    paid_at INTEGER NOT NULL,
+    amount INTEGER NOT NULL,
+    status INTEGER NOT NULL  -- index into PAYMENT_STATUSES
+);
+CREATE INDEX IF NOT EXISTS pending_payments ON payments (payment_index) WHERE status = 0;
+
+-- merged-away account_id -> group -> surviving account_id. A merge moves the
+-- smaller group's aliases into the larger one and relabels its survivor, so
+-- an alias is rewritten at most log2(aliases) times
+CREATE TABLE IF NOT EXISTS aliases (
+    account_id TEXT PRIMARY KEY,
+    group_id TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS aliases_by_group ON aliases (group_id);
+CREATE TABLE IF NOT EXISTS alias_groups (
+    group_id TEXT PRIMARY KEY,
+    survivor_id TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL  -- aliases in the group
+) WITHOUT ROWID;
+"""
+
+def _check_range(*values):
+    # SQLite INTEGER columns hold int64; checked before the cached rows
+    # change, so an operation is never half applied
+    if not all(INT64_MIN <= value <= INT64_MAX for value in values):
+        raise ValueError("timestamps, amounts and balances must fit in 64-bit integers")
+
+
+OPERATIONS = ("create_account", "deposit", "transfer", "top_spenders", "pay",
+              "get_payment_status", "merge_accounts", "get_balance", "get_balance_stats")
+
+
+class SqliteBankingSystem(BankingSystem):
+    """
+    `BankingSystem` whose state lives in a SQLite database at `path`, so
+    it is bounded by disk rather than memory and survives restarts
+    (reopening `path` continues where the last committed transaction
+    left off).
+
+    * The database runs in WAL mode, and writes are grouped into one
+      transaction per `commit_every` operations (and per
+      `execute_batch`), so a crash loses at most the operations since
+      the last commit. `commit()` ends the transaction early.
+    * Up to `cache_size` recently used accounts are kept in memory and
+      written back when evicted, at commits and before `top_spenders`.
+    * Statements are fixed strings, so the connection's statement cache
+      prepares each one only once.
+    """
+
+    def __init__(self, path, commit_every=1000, cache_size=10000, page_cache_kib=65536):
+        self.connection = sqlite3.connect(path, isolation_level=None, cached_statements=64)
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        self.connection.execute(f"PRAGMA cache_size = {-int(page_cache_kib)}")
+        self.connection.executescript(SCHEMA)
+        self.commit_every = commit_every
+        self.cache_size = max(2, cache_size)  # an operation holds up to two account rows
+        # account_id -> [balance, outgoing, next_rank, history_key, first_rank], least recent first
+        self.cache = OrderedDict()
+        self.dirty = set()  # cached account_ids not written back yet
+        self.alias_cache = {}  # account_id -> resolved account_id
+        self.writes = 0  # operations since the last commit
+
+        execute = self.connection.execute
+        self.payment_counter = execute("SELECT count(*) FROM payments").fetchone()[0]
+        pending = execute("SELECT min(payment_index) FROM payments WHERE status = 0").fetchone()[0]
+        self.next_refund = self.payment_counter if pending is None else pending
+        self.next_due = self._due_time(self.next_refund)
+        execute("BEGIN")
+
+    def commit(self):
+        self._flush()
+        self.connection.execute("COMMIT")
+        self.connection.execute("BEGIN")
+        self.writes = 0
+
+    def close(self):
+        self._flush()
+        self.connection.execute("COMMIT")
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _written(self):
+        self.writes += 1
+        if self.writes >= self.commit_every:
+            self.commit()
+
+    def _flush(self):
+        self.connection.executemany(
+            "UPDATE accounts SET balance = ?, outgoing = ?, next_rank = ?, history_key = ?, first_rank = ?"
+            " WHERE account_id = ?", [(*self.cache[account_id], account_id) for account_id in self.dirty])
+        self.dirty.clear()
+
+    def _account(self, account_id):
+        # Cached row of an account, or None
+        row = self.cache.get(account_id)
+        if row is not None:
+            self.cache.move_to_end(account_id)
+            return row
+        row = self.connection.execute(
+            "SELECT balance, outgoing, next_rank, history_key, first_rank FROM accounts WHERE account_id = ?",
+            (account_id,)).fetchone()
+        if row is None:
+            return None
+        return self._cache(account_id, list(row))
+
+    def _cache(self, account_id, row):
+        self.cache[account_id] = row
+        if len(self.cache) > self.cache_size:
+            evicted, evicted_row = self.cache.popitem(last=False)
+            if evicted in self.dirty:
+                self.dirty.discard(evicted)
+                self.connection.execute(
+                    "UPDATE accounts SET balance = ?, outgoing = ?, next_rank = ?, history_key = ?, first_rank = ?"
+                    " WHERE account_id = ?", (*evicted_row, evicted))
+        return row
+
+    def _get_actual_id(self, account_id):
+        actual_id = self.alias_cache.get(account_id)
+        if actual_id is None:
+            row = self.connection.execute(
+                "SELECT survivor_id FROM aliases JOIN alias_groups USING (group_id) WHERE account_id = ?",
+                (account_id,)).fetchone()
+            actual_id = account_id if row is None else row[0]
+            if len(self.alias_cache) >= self.cache_size:
+                self.alias_cache.clear()
+            self.alias_cache[account_id] = actual_id
+        return actual_id
+
+    def _alias_group(self, survivor_id):
+        # (group_id, size) of the aliases that resolve to survivor_id, or None
+        return self.connection.execute(
+            "SELECT group_id, size FROM alias_groups WHERE survivor_id = ?", (survivor_id,)).fetchone()
+
+    def _record_history(self, account_id, row, timestamp):
+        self.connection.execute(
+            "INSERT INTO history (account_id, timestamp, rank, balance) VALUES (?, ?, ?, ?)",
+            (row[3], timestamp, row[2], row[0]))
+        row[2] += 1
+        self.dirty.add(account_id)
+
+    def _due_time(self, index):
+        # Refund time of payment index, or None if it has not been made yet
+        if index >= self.payment_counter:
+            return None
+        paid_at = self.connection.execute(
+            "SELECT paid_at FROM payments WHERE payment_index = ?", (index,)).fetchone()[0]
+        return paid_at + CASHBACK_DELAY
+
+    def _process_cashbacks(self, timestamp):
+        # Refunds fall due in payment order, so walk forward from next_refund
+        # in small chunks until the first one that is not due
+        while self.next_due is not None and self.next_due <= timestamp:
+            rows = self.connection.execute(
+                "SELECT payment_index, account_id, paid_at, amount FROM payments"
+                " WHERE payment_index >= ? ORDER BY payment_index LIMIT 64", (self.next_refund,)).fetchall()
+            for index, account_id, paid_at, amount in rows:
+                if paid_at + CASHBACK_DELAY > timestamp:
+                    self.next_due = paid_at + CASHBACK_DELAY
+                    return
+                account_id = self._get_actual_id(account_id)
+                row = self._account(account_id)
+                if row is not None:
+                    cashback = amount * 2 // 100  # 2% cashback rounded down
+                    _check_range(paid_at + CASHBACK_DELAY, row[0] + cashback)
+                    row[0] += cashback
+                    self._record_history(account_id, row, paid_at + CASHBACK_DELAY)
+                    self.connection.execute("UPDATE payments SET status = 1 WHERE payment_index = ?", (index,))
+                self.next_refund = index + 1
+            self.next_due = self._due_time(self.next_refund)
+
+    def execute_batch(self, commands):
+        results = []
+        try:
+            for op, timestamp, *args in commands:
+                if op not in OPERATIONS:
+                    raise ValueError(f"unknown operation: {op!r}")
+                results.append(getattr(self, op)(timestamp, *args))
+        except Exception as error:
+            error.batch_results = results
+            raise
+        self.commit()
+        return results
+
+    def create_account(self, timestamp, account_id):
+        account_id = self._get_actual_id(account_id)
+        if self._account(account_id) is not None:
+            return False
+        _check_range(timestamp)
+        self.connection.execute(
+            "INSERT INTO accounts (account_id, balance, outgoing, next_rank, history_key, first_rank)"
+            " VALUES (?, 0, 0, 0, ?, 0)", (account_id, account_id))
+        self._record_history(account_id, self._cache(account_id, [0, 0, 0, account_id, 0]), timestamp)
+        self._written()
+        return True
+
+    def deposit(self, timestamp, account_id, amount):
+        self._process_cashbacks(timestamp)
+        account_id = self._get_actual_id(account_id)
+        row = self._account(account_id)
+        if row is None:
+            return None
+        _check_range(timestamp, row[0] + amount)
+        row[0] += amount
+        self._record_history(account_id, row, timestamp)
+        self._written()
+        return row[0]
+
+    def transfer(self, timestamp, source_account_id, target_account_id, amount):
+        self._process_cashbacks(timestamp)
+        source_id = self._get_actual_id(source_account_id)
+        target_id = self._get_actual_id(target_account_id)
+        if source_id == target_id:
+            return None
+        source, target = self._account(source_id), self._account(target_id)
+        if source is None or target is None or source[0] < amount:
+            return None
+        _check_range(timestamp, source[0] - amount, source[1] + amount, target[0] + amount)
+        source[0] -= amount
+        source[1] += amount
+        target[0] += amount
+        self._record_history(source_id, source, timestamp)
+        self._record_history(target_id, target, timestamp)
+        self._written()
+        return source[0]
+
+    def top_spenders(self, timestamp, n):
+        self._process_cashbacks(timestamp)
+        self._flush()
+        rows = self.connection.execute(
+            "SELECT account_id, outgoing FROM accounts ORDER BY outgoing DESC, account_id LIMIT ?",
+            (max(n, 0),))  # a negative LIMIT means no limit
+        return [f"{acc}({amt})" for acc, amt in rows]
+
+    def pay(self, timestamp, account_id, amount):
+        self._process_cashbacks(timestamp)
+        account_id = self._get_actual_id(account_id)
+        row = self._account(account_id)
+        if row is None or row[0] < amount:
+            return None
+        _check_range(timestamp, amount, row[0] - amount, row[1] + amount)
+        row[0] -= amount
+        row[1] += amount
+        self._record_history(account_id, row, timestamp)
+        index = self.payment_counter
+        self.connection.execute(
+            "INSERT INTO payments (payment_index, account_id, paid_at, amount, status) VALUES (?, ?, ?, ?, 0)",
+            (index, account_id, timestamp, amount))
+        self.payment_counter += 1
+        if self.next_due is None:
+            self.next_due = timestamp + CASHBACK_DELAY
+        self._written()
+        return f"payment{index + 1}"
+
+    def get_payment_status(self, timestamp, account_id, payment):
+        self._process_cashbacks(timestamp)
+        actual_id = self._get_actual_id(account_id)
+        if self._account(actual_id) is None:
+            return None
+        index = parse_payment_id(payment)
+        if index is None or index >= self.payment_counter:
+            return None
+        owner, status = self.connection.execute(
+            "SELECT account_id, status FROM payments WHERE payment_index = ?", (index,)).fetchone()
+        if self._get_actual_id(owner) != actual_id:
+            return None
+        return PAYMENT_STATUSES[status]
+
+    def merge_accounts(self, timestamp, account_id_1, account_id_2):
+        self._process_cashbacks(timestamp)
+        id1, id2 = self._get_actual_id(account_id_1), self._get_actual_id(account_id_2)
+        if id1 == id2:
+            return False
+        row1, row2 = self._account(id1), self._account(id2)
+        if row1 is None or row2 is None:
+            return False
+        _check_range(timestamp, row1[0] + row2[0], row1[1] + row2[1])
+        execute = self.connection.execute
+
+        # Move the smaller history: id2's rows go after id1's, or id1's before id2's
+        size1, size2 = row1[2] - row1[4], row2[2] - row2[4]
+        if size2 <= size1:
+            execute("UPDATE history SET account_id = ?, rank = rank + ? WHERE account_id = ?",
+                    (row1[3], row1[2] - row2[4], row2[3]))
+            row1[2] += size2
+        else:
+            execute("UPDATE history SET account_id = ?, rank = rank + ? WHERE account_id = ?",
+                    (row2[3], row2[4] - row1[2], row1[3]))
+            row1[2:5] = row2[2], row2[3], row2[4] - size1
+        row1[0] += row2[0]
+        row1[1] += row2[1]
+        self._record_history(id1, row1, timestamp)
+
+        # Every id that resolved to id2 now resolves to id1: id2 and its aliases
+        # join id1's group, or the smaller group's aliases join the larger one
+        group1, group2 = self._alias_group(id1), self._alias_group(id2)
+        if group2 is not None and (group1 is None or group2[1] > group1[1]):
+            group1, group2 = group2, group1
+        if group1 is None:
+            execute("INSERT INTO alias_groups (group_id, survivor_id, size) VALUES (?, ?, 0)", (id1, id1))
+            group1 = (id1, 0)
+        group_id, size = group1
+        if group2 is not None:
+            execute("UPDATE aliases SET group_id = ? WHERE group_id = ?", (group_id, group2[0]))
+            execute("DELETE FROM alias_groups WHERE group_id = ?", (group2[0],))
+            size += group2[1]
+        execute("INSERT INTO aliases (account_id, group_id) VALUES (?, ?)", (id2, group_id))
+        execute("UPDATE alias_groups SET survivor_id = ?, size = ? WHERE group_id = ?", (id1, size + 1, group_id))
+        self.alias_cache.clear()
+
+        execute("DELETE FROM accounts WHERE account_id = ?", (id2,))
+        del self.cache[id2]
+        self.dirty.discard(id2)
+        self._written()
+        return True
+
+    def get_balance(self, timestamp, account_id, time_at):
+        self._process_cashbacks(timestamp)
+        account = self._account(self._get_actual_id(account_id))
+        if account is None:
+            return None
+        row = self.connection.execute(
+            "SELECT balance FROM history WHERE account_id = ? AND timestamp <= ?"
+            " ORDER BY timestamp DESC, rank DESC LIMIT 1", (account[3], time_at)).fetchone()
+        return None if row is None else row[0]
+
+    def get_balance_stats(self, timestamp, account_id, time_from, time_to):
+        # Scans the rows of the range; BankingSystemImpl indexes them instead
+        self._process_cashbacks(timestamp)
+        account = self._account(self._get_actual_id(account_id))
+        if account is None or time_from > time_to:
+            return None
+        execute = self.connection.execute
+        first = execute(
+            "SELECT timestamp, balance FROM history WHERE account_id = ? AND timestamp <= ?"
+            " ORDER BY timestamp DESC, rank DESC LIMIT 1", (account[3], time_from)).fetchone()
+        rows = execute(
+            "SELECT timestamp, balance FROM history WHERE account_id = ? AND timestamp > ? AND timestamp <= ?"
+            " ORDER BY timestamp, rank", (account[3], time_from, time_to)).fetchall()
+        if first is not None:
+            rows.insert(0, (time_from, first[1]))
+        if not rows:
+            return None
+        balances = [balance for _, balance in rows]
+        # Each balance lasts until the next row, the last one until time_to
+        area = sum(balance * (until - since) for (since, balance), (until, _) in zip(rows, rows[1:]))
+        area += rows[-1][1] * (time_to + 1 - rows[-1][0])
+        return min(balances), max(balances), area / (time_to + 1 - rows[0][0])
@@ -0,0 +1,158 @@
+from banking_system_impl import BankingSystemImpl, CASHBACK_DELAY, PAYMENT_STATUSES
+from spender_ranking import PersistentSpenderRanking
+from array import array
+from bisect import bisect_right
+
+
+class TimeTravelBankingSystem(BankingSystemImpl):
+    """
+    `BankingSystemImpl` that can reconstruct the whole system state as of
+    a past timestamp with `state_at`.
+
+    Every accepted state change is kept in an in-memory event log with
+    its account ids already resolved, and every `checkpoint_every` events
+    the balances and outgoing totals are copied into a checkpoint. A query
+    restores the last checkpoint taken at or before `time_at` and replays
+    only the events and cashback refunds after it. A smaller interval
+    answers faster and keeps more copies.
+
+    Refunds need no events of their own: with non-decreasing timestamps
+    they fall due in payment order, so a checkpoint only records how many
+    had been applied, and a payment made at `t` is refunded as of any
+    `time_at >= t + CASHBACK_DELAY`.
+
+    The spender ranking is persistent, with one version per timestamp,
+    so `top_spenders_at` reads a past ranking directly instead of
+    replaying anything.
+    """
+
+    def __init__(self, checkpoint_every=1000, **engine_options):
+        super().__init__(**engine_options)
+        if self.lazy_settlement:
+            raise ValueError("time travel needs refunds applied in payment order (eager settlement)")
+        self.ranking = PersistentSpenderRanking()  # versioned by timestamp
+        self.checkpoint_every = checkpoint_every
+        self.events = []  # (op, resolved args) of accepted state changes
+        self.event_times = array("q")  # timestamp of every event
+        self.payers = []  # payment index -> account_id that made the payment
+        self.merged_into = {}  # merged-away account_id -> (survivor account_id, merge timestamp)
+        self.refunds_applied = 0
+        # (events applied, accounts, outgoing, refunds applied); starts empty
+        self.checkpoints = [(0, {}, {}, 0)]
+
+    def _log(self, timestamp, op, *args):
+        self.events.append((op, args))
+        self.event_times.append(timestamp)
+        self.ranking.commit(timestamp)
+        if len(self.events) % self.checkpoint_every == 0:
+            self.checkpoints.append((len(self.events), dict(self.accounts),
+                                     dict(self.outgoing), self.refunds_applied))
+
+    def _refund(self, refund_time, index):
+        super()._refund(refund_time, index)
+        self.refunds_applied += 1
+
+    def _batch_handlers(self):
+        handlers = super()._batch_handlers()
+        handlers["top_spenders_at"] = self._top_spenders_at
+        return handlers
+
+    def create_account(self, timestamp, account_id):
+        account_id = self._get_actual_id(account_id)
+        result = super().create_account(timestamp, account_id)
+        if result:
+            self._log(timestamp, "create_account", account_id)
+        return result
+
+    def _deposit(self, timestamp, account_id, amount):
+        account_id = self._get_actual_id(account_id)
+        result = super()._deposit(timestamp, account_id, amount)
+        if result is not None:
+            self._log(timestamp, "deposit", account_id, amount)
+        return result
+
+    def _transfer(self, timestamp, source_id, target_id, amount):
+        source_id, target_id = self._get_actual_id(source_id), self._get_actual_id(target_id)
+        result = super()._transfer(timestamp, source_id, target_id, amount)
+        if result is not None:
+            self._log(timestamp, "transfer", source_id, target_id, amount)
+        return result
+
+    def _pay(self, timestamp, account_id, amount):
+        account_id = self._get_actual_id(account_id)
+        result = super()._pay(timestamp, account_id, amount)
+        if result is not None:
+            self.payers.append(account_id)
+            self._log(timestamp, "pay", account_id, amount)
+        return result
+
+    def _merge_accounts(self, timestamp, id1, id2):
+        id1, id2 = self._get_actual_id(id1), self._get_actual_id(id2)
+        result = super()._merge_accounts(timestamp, id1, id2)
+        if result:
+            self.merged_into[id2] = (id1, timestamp)
+            self._log(timestamp, "merge_accounts", id1, id2)
+        return result
+
+    def top_spenders_at(self, timestamp, n, time_at):
+        """
+        Returns what `top_spenders(time_at, n)` returned, or would have
+        returned, at `time_at`: merges up to `time_at` are reflected and
+        accounts created later are not.
+        """
+        self._settle(timestamp)
+        return self._top_spenders_at(timestamp, n, time_at)
+
+    def _top_spenders_at(self, timestamp, n, time_at):
+        return [f"{acc}({amt})" for acc, amt in self.ranking.top_at(time_at, n)]
+
+    def _resolve_at(self, account_id, time_at):
+        # Follows only the merges that happened at or before time_at
+        while account_id in self.merged_into:
+            survivor, merged_at = self.merged_into[account_id]
+            if merged_at > time_at:
+                break
+            account_id = survivor
+        return account_id
+
+    def state_at(self, time_at):
+        """
+        Returns the state after every operation at or before `time_at`:
+        `{"accounts": {account_id: balance}, "outgoing": {account_id:
+        total outgoing}, "payments": {payment_id: status}}` for the
+        accounts that existed then and the payments made by then.
+        """
+        events = bisect_right(self.event_times, time_at)
+        position = bisect_right(self.checkpoints, events, key=lambda checkpoint: checkpoint[0]) - 1
+        applied, accounts, outgoing, refunds = self.checkpoints[position]
+        accounts, outgoing = dict(accounts), dict(outgoing)
+
+        for op, args in self.events[applied:events]:
+            if op == "create_account":
+                accounts[args[0]] = 0
+            elif op == "deposit":
+                accounts[args[0]] += args[1]
+            elif op == "transfer":
+                source_id, target_id, amount = args
+                accounts[source_id] -= amount
+                accounts[target_id] += amount
+                outgoing[source_id] = outgoing.get(source_id, 0) + amount
+            elif op == "pay":
+                accounts[args[0]] -= args[1]
+                outgoing[args[0]] = outgoing.get(args[0], 0) + args[1]
+            elif op == "merge_accounts":
+                id1, id2 = args
+                accounts[id1] += accounts.pop(id2)
+                outgoing[id1] = outgoing.get(id1, 0) + outgoing.pop(id2, 0)
+
+        # Payments made by time_at, and those among them refunded by time_at
+        paid = bisect_right(self.payment_times, time_at)
+        refunded = bisect_right(self.payment_times, time_at - CASHBACK_DELAY)
+        for index in range(refunds, refunded):
+            accounts[self._resolve_at(self.payers[index], time_at)] += self.payment_amounts[index] * 2 // 100
+
+        return {
+            "accounts": accounts,
+            "outgoing": {account_id: outgoing.get(account_id, 0) for account_id in accounts},
+            "payments": {f"payment{index + 1}": PAYMENT_STATUSES[index < refunded] for index in range(paid)},
+        }
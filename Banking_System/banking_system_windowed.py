@@ -0,0 +1,54 @@
+from banking_system_impl import BankingSystemImpl
+from spender_ranking import WindowedSpenderRanking
+
+
+class WindowedBankingSystem(BankingSystemImpl):
+    """
+    `BankingSystemImpl` that also ranks accounts by their outgoing
+    transfers and payments over the last `window` milliseconds, for
+    `top_spenders_in_window`. See `WindowedSpenderRanking` for how
+    `bucket_width` trades window precision for memory.
+    """
+
+    def __init__(self, window=3600000, bucket_width=None, **engine_options):
+        super().__init__(**engine_options)
+        self.window_ranking = WindowedSpenderRanking(window, bucket_width, self.aliases.find)
+
+    def _batch_handlers(self):
+        handlers = super()._batch_handlers()
+        handlers["top_spenders_in_window"] = self._top_spenders_in_window
+        return handlers
+
+    def _transfer(self, timestamp, source_id, target_id, amount):
+        source_id = self._get_actual_id(source_id)
+        result = super()._transfer(timestamp, source_id, target_id, amount)
+        if result is not None:
+            self.window_ranking.add(timestamp, source_id, amount)
+        return result
+
+    def _pay(self, timestamp, account_id, amount):
+        account_id = self._get_actual_id(account_id)
+        result = super()._pay(timestamp, account_id, amount)
+        if result is not None:
+            self.window_ranking.add(timestamp, account_id, amount)
+        return result
+
+    def _merge_accounts(self, timestamp, id1, id2):
+        id1, id2 = self._get_actual_id(id1), self._get_actual_id(id2)
+        result = super()._merge_accounts(timestamp, id1, id2)
+        if result:
+            self.window_ranking.merge(id1, id2)
+        return result
+
+    def top_spenders_in_window(self, timestamp, n):
+        """
+        Returns the top `n` accounts by outgoing transfers and payments
+        in the `window` milliseconds up to `timestamp`, formatted like
+        `top_spenders`. Accounts with no spending in the window are not
+        listed; spending of merged accounts counts for the survivor.
+        """
+        self._settle(timestamp)
+        return self._top_spenders_in_window(timestamp, n)
+
+    def _top_spenders_in_window(self, timestamp, n):
+        return [f"{acc}({amt})" for acc, amt in self.window_ranking.top(timestamp, n)]
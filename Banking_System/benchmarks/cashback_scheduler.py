@@ -0,0 +1,143 @@
+"""
+Compares cashback schedulers at a steady number of outstanding
+cashbacks: every operation schedules one refund and settles the ones
+that fell due, as `pay` and `_process_cashbacks` do.
+
+* list rebuild: the original scan that rebuilt the pending list on
+  every operation
+* heap: a min-heap of (refund time, payment index)
+* fifo: a deque of the same tuples; refunds fall due in payment order
+* cursor: what `BankingSystemImpl` does, an index into the payment
+  columns it keeps anyway
+
+Run from the `Banking_System` directory:
+
+    python -m benchmarks.cashback_scheduler --outstanding 1000000
+"""
+from array import array
+from collections import deque
+import argparse
+import heapq
+import sys
+import time
+
+from banking_system_impl import CASHBACK_DELAY
+from benchmarks.history_memory import deep_size
+
+
+class ListRebuild:
+    def __init__(self):
+        self.pending = []
+
+    def schedule(self, timestamp, index):
+        self.pending.append((timestamp + CASHBACK_DELAY, index))
+
+    def settle(self, timestamp):
+        refunded, pending = 0, []
+        for refund_time, index in self.pending:
+            if refund_time <= timestamp:
+                refunded += 1
+            else:
+                pending.append((refund_time, index))
+        self.pending = pending
+        return refunded
+
+    def memory(self):
+        return deep_size(self.pending)
+
+
+class Heap:
+    def __init__(self):
+        self.pending = []
+
+    def schedule(self, timestamp, index):
+        heapq.heappush(self.pending, (timestamp + CASHBACK_DELAY, index))
+
+    def settle(self, timestamp):
+        refunded, pending = 0, self.pending
+        while pending and pending[0][0] <= timestamp:
+            heapq.heappop(pending)
+            refunded += 1
+        return refunded
+
+    def memory(self):
+        return deep_size(self.pending)
+
+
+class Fifo:
+    def __init__(self):
+        self.pending = deque()
+
+    def schedule(self, timestamp, index):
+        self.pending.append((timestamp + CASHBACK_DELAY, index))
+
+    def settle(self, timestamp):
+        refunded, pending = 0, self.pending
+        while pending and pending[0][0] <= timestamp:
+            pending.popleft()
+            refunded += 1
+        return refunded
+
+    def memory(self):
+        return sys.getsizeof(self.pending) + sum(deep_size(entry) for entry in self.pending)
+
+
+class Cursor:
+    def __init__(self):
+        self.payment_times = array("q")
+        self.next_refund = 0
+
+    def schedule(self, timestamp, index):
+        self.payment_times.append(timestamp)
+
+    def settle(self, timestamp):
+        index, due, times = self.next_refund, timestamp - CASHBACK_DELAY, self.payment_times
+        while index < len(times) and times[index] <= due:
+            index += 1
+        refunded, self.next_refund = index - self.next_refund, index
+        return refunded
+
+    def memory(self):
+        # payment_times is a column the engine stores for every payment anyway
+        return 0
+
+
+SCHEDULERS = {"list rebuild": ListRebuild, "heap": Heap, "fifo": Fifo, "cursor": Cursor}
+
+
+def measure(scheduler, outstanding, operations):
+    # -> (microseconds per operation, pending bytes per outstanding cashback)
+    step = max(1, CASHBACK_DELAY // outstanding)  # one payment per step keeps `outstanding` pending
+    for index in range(outstanding):
+        scheduler.schedule(index * step, index)
+    memory = scheduler.memory()
+    timestamp = max(outstanding * step, CASHBACK_DELAY)
+    refunded = 0
+    started = time.perf_counter()
+    for index in range(outstanding, outstanding + operations):
+        scheduler.schedule(timestamp, index)
+        refunded += scheduler.settle(timestamp)
+        timestamp += step
+    elapsed = time.perf_counter() - started
+    assert refunded >= operations, "every operation should settle about one refund"
+    return elapsed / operations * 1e6, memory / outstanding
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--outstanding", type=int, default=1000000)
+    parser.add_argument("--operations", type=int, default=200000)
+    parser.add_argument("--list-operations", type=int, default=20,
+                        help="operations for the list rebuild, which scans every pending cashback")
+    args = parser.parse_args()
+
+    print(f"{args.outstanding} outstanding cashbacks")
+    print(f"{'scheduler':<16}{'us/op':>12}{'bytes/pending':>16}")
+    for name, scheduler in SCHEDULERS.items():
+        operations = args.list_operations if scheduler is ListRebuild else args.operations
+        per_op, per_pending = measure(scheduler(), args.outstanding, operations)
+        print(f"{name:<16}{per_op:>12.2f}{per_pending:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
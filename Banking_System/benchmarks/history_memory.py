@@ -0,0 +1,60 @@
+"""
+Reports the memory cost of one balance history entry for each history
+backend of `BankingSystemImpl`, next to the original layout of one
+`(timestamp, balance)` tuple per entry.
+
+Run from the `Banking_System` directory:
+
+    python -m benchmarks.history_memory --accounts 1000 --entries 200000
+"""
+import argparse
+import random
+import sys
+
+from banking_system_impl import HISTORY_BACKENDS, BankingSystemImpl
+
+
+def deep_size(obj):
+    # getsizeof of a container plus the objects it holds (arrays hold no objects)
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(key) + deep_size(value) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        size += sum(deep_size(item) for item in obj)
+    return size
+
+
+def populate(system, accounts, entries, seed):
+    rng = random.Random(seed)
+    account_ids = [f"account{i}" for i in range(accounts)]
+    timestamp = 0
+    for account_id in account_ids:
+        timestamp += 1
+        system.create_account(timestamp, account_id)
+    for _ in range(entries - accounts):
+        timestamp += rng.randint(1, 1000)
+        system.deposit(timestamp, rng.choice(account_ids), rng.randint(1, 10 ** 6))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--accounts", type=int, default=1000)
+    parser.add_argument("--entries", type=int, default=200000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'layout':<16}{'bytes/entry':>12}")
+    for backend in HISTORY_BACKENDS:
+        system = BankingSystemImpl(history_backend=backend)
+        populate(system, args.accounts, args.entries, args.seed)
+        total = deep_size(system.history_times) + deep_size(system.history_balances)
+        if backend == "list":
+            # the original layout: account_id -> [(timestamp, balance)]
+            tuples = {account_id: list(zip(times, system.history_balances[account_id]))
+                      for account_id, times in system.history_times.items()}
+            print(f"{'tuple list':<16}{deep_size(tuples) / args.entries:>12.1f}")
+        print(f"{backend:<16}{total / args.entries:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
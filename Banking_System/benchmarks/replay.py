@@ -0,0 +1,87 @@
+"""
+Replays a trace written by `trace_recorder.TraceRecorder` into a
+`BankingSystem` implementation as fast as it will go, and reports the
+throughput per operation and every result that differs from the
+recorded one.
+
+Records are decoded a chunk at a time outside the timed loop, so only
+the engine calls are measured. Run from the `Banking_System` directory:
+
+    python -m benchmarks.replay calls.trace
+    python -m benchmarks.replay calls.trace --engine banking_system_sqlite:SqliteBankingSystem --option path=:memory:
+"""
+from itertools import islice
+import argparse
+import sys
+import time
+
+from benchmarks.run import load_engine
+from trace_recorder import TraceError, read_trace
+
+CHUNK = 100000  # records decoded ahead of each timed run
+
+
+def replay(system, records, verify=True, chunk=CHUNK):
+    """
+    Feeds `(op, timestamp, args, result)` records into `system`. Returns
+    `({op: (count, seconds)}, mismatches)` where mismatches lists
+    `(record number, op, timestamp, args, recorded result, replayed
+    result)`; a call that raises replays as a `TraceError`.
+    """
+    methods, counts, totals = {}, {}, {}
+    mismatches = []
+    clock = time.perf_counter
+    records = iter(records)
+    number = 0
+    while True:
+        batch = list(islice(records, chunk))
+        if not batch:
+            return {op: (counts[op], totals[op]) for op in counts}, mismatches
+        for op, timestamp, args, expected in batch:
+            method = methods.get(op)
+            if method is None:
+                method = methods[op] = getattr(system, op)
+                counts[op], totals[op] = 0, 0.0
+            start = clock()
+            try:
+                # execute_batch is recorded with its commands as the only argument
+                result = method(*args) if op == "execute_batch" else method(timestamp, *args)
+            except Exception as error:
+                result = TraceError(type(error).__name__, str(error))
+            totals[op] += clock() - start
+            counts[op] += 1
+            if verify and result != expected:
+                mismatches.append((number, op, timestamp, args, expected, result))
+            number += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("trace")
+    parser.add_argument("--engine", default="banking_system_impl:BankingSystemImpl")
+    parser.add_argument("--option", action="append", default=[], metavar="KEY=VALUE",
+                        help="constructor keyword argument for the engine (string value)")
+    parser.add_argument("--no-verify", action="store_true", help="do not compare results")
+    parser.add_argument("--show", type=int, default=10, help="mismatches to print")
+    args = parser.parse_args()
+
+    system = load_engine(args.engine, dict(option.split("=", 1) for option in args.option))
+    stats, mismatches = replay(system, read_trace(args.trace), verify=not args.no_verify)
+    calls = sum(count for count, _ in stats.values())
+    seconds = sum(total for _, total in stats.values())
+
+    print(f"{args.engine}: {calls} calls in {seconds:.2f} s, {calls / max(seconds, 1e-9):.0f} calls/sec")
+    print(f"{'operation':<20}{'count':>10}{'calls/sec':>12}{'mean us':>10}")
+    for op, (count, total) in sorted(stats.items()):
+        print(f"{op:<20}{count:>10}{count / max(total, 1e-9):>12.0f}{total / count * 1e6:>10.1f}")
+    if args.no_verify:
+        return
+    print(f"{len(mismatches)} mismatched results")
+    for number, op, timestamp, call_args, expected, result in mismatches[:args.show]:
+        print(f"  #{number} {op}{(timestamp,) + call_args}: recorded {expected!r}, replayed {result!r}")
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
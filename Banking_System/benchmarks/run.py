@@ -0,0 +1,113 @@
+"""
+Runs synthetic workloads from `benchmarks.workload` against a
+`BankingSystem` implementation at growing scales, and reports per
+operation throughput and p50/p99 latency plus the peak memory of each
+run.
+
+Run from the `Banking_System` directory:
+
+    python -m benchmarks.run --scales 1000x100000 10000x1000000 100000x10000000
+    python -m benchmarks.run --engine banking_system_impl:BankingSystemImpl --option history_backend=array
+"""
+import argparse
+import importlib
+import multiprocessing
+import random
+import resource
+import time
+
+from benchmarks.workload import generate
+
+SAMPLES = 20000  # latency samples kept per operation (reservoir sampling)
+
+
+def load_engine(spec, options):
+    # "module:Class" -> instance
+    module_name, _, class_name = spec.partition(":")
+    return getattr(importlib.import_module(module_name), class_name)(**options)
+
+
+def percentile(sorted_samples, fraction):
+    return sorted_samples[min(len(sorted_samples) - 1, int(fraction * len(sorted_samples)))]
+
+
+def run_scale(engine, options, accounts, operations, workload_options, seed):
+    # Runs one workload; returns ({op: (count, seconds, p50_us, p99_us)}, seconds, peak RSS in MB)
+    system = load_engine(engine, options)
+    rng = random.Random(seed)
+    methods = {}
+    counts, totals, samples = {}, {}, {}
+    commands = generate(accounts, operations, seed=seed, **workload_options)
+    # the first 2 * accounts commands create and fund the accounts
+    for _ in range(2 * accounts):
+        op, timestamp, *args = next(commands)
+        getattr(system, op)(timestamp, *args)
+
+    clock = time.perf_counter_ns
+    started = clock()
+    for op, timestamp, *args in commands:
+        method = methods.get(op)
+        if method is None:
+            method = methods[op] = getattr(system, op)
+            counts[op], totals[op], samples[op] = 0, 0, []
+        start = clock()
+        method(timestamp, *args)
+        elapsed = clock() - start
+        count = counts[op] = counts[op] + 1
+        totals[op] += elapsed
+        if count <= SAMPLES:
+            samples[op].append(elapsed)
+        else:
+            slot = rng.randrange(count)
+            if slot < SAMPLES:
+                samples[op][slot] = elapsed
+    wall = (clock() - started) / 1e9
+
+    stats = {}
+    for op in counts:
+        ordered = sorted(samples[op])
+        stats[op] = (counts[op], totals[op] / 1e9,
+                     percentile(ordered, 0.50) / 1e3, percentile(ordered, 0.99) / 1e3)
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # kilobytes on Linux
+    return stats, wall, peak_mb
+
+
+def _run_in_child(queue, *args):
+    queue.put(run_scale(*args))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--engine", default="banking_system_impl:BankingSystemImpl")
+    parser.add_argument("--option", action="append", default=[], metavar="KEY=VALUE",
+                        help="constructor keyword argument for the engine (string value)")
+    parser.add_argument("--scales", nargs="+", default=["1000x100000", "10000x300000"],
+                        metavar="ACCOUNTSxOPERATIONS")
+    parser.add_argument("--skew", type=float, default=1.0)
+    parser.add_argument("--merge-chain-depth", type=int, default=4)
+    parser.add_argument("--pending-cashbacks", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    options = dict(option.split("=", 1) for option in args.option)
+    workload_options = {"skew": args.skew, "merge_chain_depth": args.merge_chain_depth,
+                        "pending_cashbacks": args.pending_cashbacks}
+    for scale in args.scales:
+        accounts, operations = (int(part) for part in scale.split("x"))
+        # a fresh process per scale, so peak memory is that run's alone
+        queue = multiprocessing.Queue()
+        child = multiprocessing.Process(target=_run_in_child, args=(
+            queue, args.engine, options, accounts, operations, workload_options, args.seed))
+        child.start()
+        stats, wall, peak_mb = queue.get()
+        child.join()
+
+        print(f"\n{args.engine} with {accounts} accounts, {operations} operations: "
+              f"{operations / wall:.0f} ops/sec, peak RSS {peak_mb:.1f} MB")
+        print(f"{'operation':<20}{'count':>10}{'ops/sec':>12}{'p50 us':>10}{'p99 us':>10}")
+        for op, (count, seconds, p50, p99) in sorted(stats.items()):
+            print(f"{op:<20}{count:>10}{count / seconds:>12.0f}{p50:>10.1f}{p99:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Measures `ShardedBankingSystem` throughput (ops/sec) against the number
+of worker processes, with a single in-process `BankingSystemImpl` as the
+baseline.
+
+Run from the `Banking_System` directory:
+
+    python -m benchmarks.sharded_throughput --accounts 10000 --ops 200000 --workers 1 2 4 8
+"""
+import argparse
+import os
+import time
+
+from banking_system_impl import BankingSystemImpl
+from banking_system_sharded import ShardedBankingSystem
+from benchmarks.workload import generate
+
+
+# Mostly single-account traffic plus transfers, which cross shards
+MIX = {"deposit": 40, "transfer": 30, "pay": 25, "get_balance": 4.9, "top_spenders": 0.1}
+
+
+def measure(system, commands, batch):
+    start = time.perf_counter()
+    for i in range(0, len(commands), batch):
+        system.execute_batch(commands[i:i + batch])
+    return len(commands) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--accounts", type=int, default=10000)
+    parser.add_argument("--ops", type=int, default=200000)
+    parser.add_argument("--batch", type=int, default=20000, help="commands per execute_batch call")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    commands = list(generate(args.accounts, args.ops, mix=MIX, skew=0, seed=args.seed))
+    print(f"{len(commands)} commands on {os.cpu_count()} cores")
+    print(f"{'engine':<24}{'ops/sec':>12}")
+    print(f"{'in-process':<24}{measure(BankingSystemImpl(), commands, args.batch):>12.0f}")
+    for workers in sorted(set(args.workers)):
+        with ShardedBankingSystem(workers=workers) as system:
+            print(f"{f'sharded x{workers}':<24}{measure(system, commands, args.batch):>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Seeded synthetic workloads for `BankingSystem` implementations.
+
+`generate` yields `(op, timestamp, *args)` commands, the format taken by
+`BankingSystem.execute_batch`, one at a time, so workloads of 10^7
+operations never have to be held in memory.
+"""
+from itertools import accumulate
+import random
+
+from banking_system_impl import CASHBACK_DELAY
+
+DEFAULT_MIX = {
+    "deposit": 30,
+    "transfer": 25,
+    "pay": 20,
+    "get_balance": 12,
+    "get_payment_status": 6,
+    "top_spenders": 2,
+    "create_account": 4,
+    "merge_accounts": 1,
+}
+
+
+def generate(accounts=1000, operations=100000, mix=None, skew=1.0, merge_chain_depth=4,
+             pending_cashbacks=1000, seed=0):
+    """
+    Yields a setup phase that creates and funds `accounts` accounts,
+    followed by `operations` commands drawn from `mix` (op -> weight,
+    `DEFAULT_MIX` by default).
+
+    * `skew` is the Zipf exponent of account popularity (0 is uniform).
+    * Merges build alias chains: the head of a chain is merged into a
+      fresh account until the chain is `merge_chain_depth` merges long,
+      then a new chain starts. Later commands keep using merged-away ids.
+    * Timestamps advance so that about `pending_cashbacks` cashbacks are
+      outstanding once the first 24 hours have passed.
+    """
+    rng = random.Random(seed)
+    mix = DEFAULT_MIX if mix is None else mix
+    ops = list(mix)
+    op_weights = list(accumulate(mix[op] for op in ops))
+    pay_share = mix.get("pay", 0) / op_weights[-1]
+    # pays per op * CASHBACK_DELAY / step = cashbacks outstanding
+    step = max(1, round(pay_share * CASHBACK_DELAY / max(pending_cashbacks, 1)))
+
+    account_ids = [f"account{i}" for i in range(accounts)]
+    popularity = list(accumulate(1 / (rank + 1) ** skew for rank in range(accounts)))
+    payments = 0
+    chain_head, chain_depth = None, 0
+    timestamp = 1
+
+    def pick():
+        return rng.choices(account_ids, cum_weights=popularity)[0]
+
+    for account_id in account_ids:
+        yield ("create_account", timestamp, account_id)
+    timestamp += 1
+    for account_id in account_ids:
+        yield ("deposit", timestamp, account_id, rng.randint(10 ** 5, 10 ** 6))
+
+    for _ in range(operations):
+        timestamp += rng.randint(0, 2 * step)
+        op = rng.choices(ops, cum_weights=op_weights)[0]
+        if op == "create_account":
+            account_ids.append(f"account{len(account_ids)}")
+            popularity.append(popularity[-1] + 1 / len(account_ids) ** skew)
+            yield (op, timestamp, account_ids[-1])
+        elif op == "deposit":
+            yield (op, timestamp, pick(), rng.randint(1, 10 ** 4))
+        elif op == "transfer":
+            yield (op, timestamp, pick(), pick(), rng.randint(1, 10 ** 4))
+        elif op == "pay":
+            payments += 1
+            yield (op, timestamp, pick(), rng.randint(1, 10 ** 4))
+        elif op == "get_balance":
+            yield (op, timestamp, pick(), rng.randint(1, timestamp))
+        elif op == "get_payment_status":
+            yield (op, timestamp, pick(), f"payment{rng.randint(1, max(payments, 1))}")
+        elif op == "top_spenders":
+            yield (op, timestamp, rng.choice((1, 5, 10, 100)))
+        elif op == "merge_accounts":
+            if chain_head is None or chain_depth >= merge_chain_depth:
+                chain_head, chain_depth = pick(), 0
+            survivor = pick()
+            yield (op, timestamp, survivor, chain_head)
+            chain_head, chain_depth = survivor, chain_depth + 1
+        else:
+            raise ValueError(f"unknown operation in mix: {op!r}")
@@ -0,0 +1,207 @@
+"""
+Bulk simulation of columnar operation streams for capacity planning.
+
+    simulate(system, ops, timestamps, accounts, amounts, targets, account_ids)
+
+runs `len(ops)` operations through a `BankingSystemImpl` and leaves it in
+the state that calling the operations one at a time would: the same
+balances, balance histories, outgoing totals, payments and payment
+statuses. The operations are columns of equal length: `ops` holds codes
+into `BULK_OPERATIONS`, `accounts` and `targets` hold indices into
+`account_ids` (`targets` is the target of a transfer or the merged-away
+account of a merge), and `timestamps` must not decrease.
+
+With NumPy installed, runs of deposits, payments and transfers between
+creates and merges are applied with array operations: every posting of
+the run, including the cashbacks that fall due inside it, is sorted by
+account and summed, and the first payment or transfer that would
+overdraw its account ends the vectorized prefix. That operation, and
+every create and merge, goes through the scalar engine. Without NumPy,
+or for a subclass of `BankingSystemImpl` (whose overridden bodies a
+vectorized run would skip), everything is scalar.
+"""
+from banking_system_impl import BankingSystemImpl, CASHBACK_DELAY
+
+try:
+    import numpy as np
+except ImportError:  # optional: scalar fallback
+    np = None
+
+BULK_OPERATIONS = ("create_account", "deposit", "transfer", "pay", "merge_accounts")
+CREATE_ACCOUNT, DEPOSIT, TRANSFER, PAY, MERGE_ACCOUNTS = range(len(BULK_OPERATIONS))
+RUN_LENGTH = 1 << 16  # most operations one vectorized run covers
+MIN_RUN_LENGTH = 64  # run length after overdrafts, which end a run early
+
+
+def simulate(system, ops, timestamps, accounts, amounts, targets, account_ids):
+    """
+    Applies the operations to `system`. Returns `{"vectorized": count,
+    "scalar": count}` of the operations applied each way.
+    """
+    if len(set(map(len, (ops, timestamps, accounts, amounts, targets)))) > 1:
+        raise ValueError("operation columns differ in length")
+    if np is None or type(system) is not BankingSystemImpl or system.lazy_settlement:
+        for index in range(len(ops)):
+            _call(system, ops[index], timestamps[index], account_ids[accounts[index]],
+                  account_ids[targets[index]], amounts[index])
+        return {"vectorized": 0, "scalar": len(ops)}
+
+    ops = np.asarray(ops, dtype=np.int8)
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    accounts, targets = np.asarray(accounts, dtype=np.int64), np.asarray(targets, dtype=np.int64)
+    amounts = np.asarray(amounts, dtype=np.int64)
+    if len(timestamps) and np.any(timestamps[1:] < timestamps[:-1]):
+        raise ValueError("timestamps must not decrease")
+    # Creates and merges change which accounts exist and what ids resolve to
+    breaks = np.flatnonzero((ops == CREATE_ACCOUNT) | (ops == MERGE_ACCOUNTS))
+    columns = (ops, timestamps, accounts, amounts, targets)
+    counts = {"vectorized": 0, "scalar": 0}
+    position, length = 0, RUN_LENGTH
+    while position < len(ops):
+        if ops[position] == CREATE_ACCOUNT or ops[position] == MERGE_ACCOUNTS:
+            end = position
+        else:
+            # Payments of a run refund after it, so every cashback due inside a
+            # run comes from a payment already in the columns
+            following = np.searchsorted(breaks, position)
+            next_break = int(breaks[following]) if following < len(breaks) else len(ops)
+            end = min(position + length, next_break,
+                      int(np.searchsorted(timestamps, timestamps[position] + CASHBACK_DELAY)))
+        applied = _apply_run(system, columns, account_ids, position, end) if end > position else 0
+        counts["vectorized"] += applied
+        position += applied
+        if position < end:
+            length = max(MIN_RUN_LENGTH, 2 * applied)  # overdraft: shorter runs for a while
+        elif applied:
+            length = min(RUN_LENGTH, 2 * length)
+            continue
+        if position < len(ops):
+            # A create, a merge or the overdrawing operation
+            _call(system, int(ops[position]), int(timestamps[position]), account_ids[accounts[position]],
+                  account_ids[targets[position]], int(amounts[position]))
+            counts["scalar"] += 1
+            position += 1
+    return counts
+
+
+def _call(system, op, timestamp, account_id, target_id, amount):
+    if op == CREATE_ACCOUNT:
+        system.create_account(timestamp, account_id)
+    elif op == DEPOSIT:
+        system.deposit(timestamp, account_id, amount)
+    elif op == TRANSFER:
+        system.transfer(timestamp, account_id, target_id, amount)
+    elif op == PAY:
+        system.pay(timestamp, account_id, amount)
+    elif op == MERGE_ACCOUNTS:
+        system.merge_accounts(timestamp, account_id, target_id)
+    else:
+        raise ValueError(f"unknown operation code: {op!r}")
+
+
+def _apply_run(system, columns, account_ids, start, end):
+    # Applies the deposits, transfers and payments in [start, end) up to the
+    # first one that overdraws its account; returns how many were applied
+    ops, timestamps, accounts, amounts, targets = (column[start:end] for column in columns)
+    transfers = ops == TRANSFER
+
+    # Account codes -> local slots of the ids they resolve to (-1: no such account)
+    codes, inverse = np.unique(np.concatenate((accounts, targets[transfers])), return_inverse=True)
+    slot_ids, slot_of = [], {}
+    code_slots = np.empty(len(codes), dtype=np.int64)
+    for position, code in enumerate(codes.tolist()):
+        account_id = system._get_actual_id(account_ids[code])
+        if account_id not in system.accounts:
+            code_slots[position] = -1
+            continue
+        slot = slot_of.get(account_id)
+        if slot is None:
+            slot = slot_of[account_id] = len(slot_ids)
+            slot_ids.append(account_id)
+        code_slots[position] = slot
+    sources = code_slots[inverse[:len(ops)]]
+    targets = np.full(len(ops), -1, dtype=np.int64)
+    targets[transfers] = code_slots[inverse[len(ops):]]
+
+    # Operations the engine rejects whatever the balances change nothing
+    valid = (sources >= 0) & (~transfers | ((targets >= 0) & (targets != sources)))
+
+    # Cashbacks due within the run, in payment order
+    first = system.next_refund
+    paid_at = np.frombuffer(system.payment_times, dtype=np.int64)[first:]
+    last = first + int(np.searchsorted(paid_at, timestamps[-1] - CASHBACK_DELAY, side="right"))
+    refund_times = paid_at[:last - first] + CASHBACK_DELAY
+    del paid_at  # an array column cannot grow while a view of it exists
+    owners = system.payment_owners[first:last]
+    owner_slots = {}
+    for owner in set(owners):
+        account_id = system._get_actual_id(owner)
+        if account_id in system.accounts and account_id not in slot_of:
+            slot_of[account_id] = len(slot_ids)
+            slot_ids.append(account_id)
+        owner_slots[owner] = slot_of.get(account_id, -1)
+    refund_slots = np.array([owner_slots[owner] for owner in owners], dtype=np.int64)
+    refunds = np.frombuffer(system.payment_amounts, dtype=np.int64)[first:last] * 2 // 100
+    # A cashback is settled before the first operation at or after its refund time
+    refund_before = np.searchsorted(timestamps, refund_times)
+
+    # Postings ordered by key: cashbacks before operation i get 4i, the
+    # operation's debit or deposit 4i + 1 and a transfer's credit 4i + 2
+    operation = np.flatnonzero(valid)
+    credits = operation[transfers[operation]]
+    debits = ops[operation] != DEPOSIT
+    posted = refund_slots >= 0
+    slots = np.concatenate((refund_slots[posted], sources[operation], targets[credits]))
+    keys = np.concatenate((4 * refund_before[posted], 4 * operation + 1, 4 * credits + 2))
+    deltas = np.concatenate((refunds[posted], np.where(debits, -amounts[operation], amounts[operation]),
+                             amounts[credits]))
+    times = np.concatenate((refund_times[posted], timestamps[operation], timestamps[credits]))
+
+    # Balance after every posting: a running sum within each account's group
+    order = np.argsort(slots * (4 * len(ops) + 4) + keys, kind="stable")
+    slots, keys, times, deltas = slots[order], keys[order], times[order], deltas[order]
+    running = np.cumsum(deltas)
+    starts = np.diff(slots, prepend=-1) != 0
+    group_base = (running - deltas)[starts][np.cumsum(starts) - 1]
+    opening = np.array([system.accounts[account_id] for account_id in slot_ids], dtype=np.int64)
+    balances = opening[slots] + running - group_base
+
+    # The first overdrawing debit ends the run; everything keyed before it stands
+    overdrawn = keys[(balances < 0) & (keys % 4 == 1)]
+    applied = int(overdrawn.min()) // 4 if len(overdrawn) else len(ops)
+    if applied == 0:
+        return 0
+    kept = keys < 4 * applied
+    slots, keys, times, balances = slots[kept], keys[kept], times[kept], balances[kept]
+
+    # Statuses from the cursor on are all 0; as in _refund, a cashback whose
+    # account is gone leaves its payment IN_PROGRESS
+    refunded = int(np.count_nonzero(refund_before < applied))
+    touched = np.unique(slots).tolist()
+    if system._snapshots:
+        system._preserve(*(slot_ids[slot] for slot in touched), payments=range(first, first + refunded))
+    bounds = np.searchsorted(slots, touched + [len(slot_ids)])
+    times_list, balances_list = times.tolist(), balances.tolist()
+    for slot, lo, hi in zip(touched, bounds, bounds[1:]):
+        account_id = slot_ids[slot]
+        system.accounts[account_id] = balances_list[hi - 1]
+        system.history_times[account_id].extend(times_list[lo:hi])
+        system.history_balances[account_id].extend(balances_list[lo:hi])
+
+    operation = operation[operation < applied]
+    spending = operation[ops[operation] != DEPOSIT]
+    totals = np.zeros(len(slot_ids), dtype=np.int64)
+    np.add.at(totals, sources[spending], amounts[spending])
+    for slot in np.unique(sources[spending]).tolist():
+        system._add_outgoing(slot_ids[slot], int(totals[slot]))
+
+    payments = spending[ops[spending] == PAY]
+    system.payment_owners.extend([slot_ids[slot] for slot in sources[payments].tolist()])
+    system.payment_times.extend(timestamps[payments].tolist())
+    system.payment_amounts.extend(amounts[payments].tolist())
+    system.payment_statuses.extend(bytes(len(payments)))
+    system.payment_counter += len(payments)
+
+    system.payment_statuses[first:first + refunded] = (refund_slots[:refunded] >= 0).astype(np.uint8).tobytes()
+    system.next_refund = first + refunded
+    return applied
@@ -0,0 +1,215 @@
+"""
+Opt-in instrumentation for `BankingSystem` implementations.
+
+    metrics = Instrumentation()
+    metrics.attach(system)
+    ...
+    metrics.snapshot()         # plain dict
+    metrics.prometheus_text()  # Prometheus text exposition format
+    metrics.detach()
+
+Attaching wraps the methods of one instance (instance attributes shadowing
+the class methods), so systems that are not instrumented run the plain
+class code and pay nothing.
+"""
+from bisect import bisect_left
+import threading
+import time
+
+INSTRUMENTED_METHODS = (
+    "create_account", "deposit", "transfer", "top_spenders", "pay",
+    "get_payment_status", "merge_accounts", "get_balance", "get_balance_stats", "execute_batch",
+)
+LATENCY_BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 1e-2, 1e-1, 1.0)
+COUNT_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128, 1024)
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram; `counts[i]` counts values <= `bounds[i]` and
+    above the previous bound, the last slot counts everything larger.
+    """
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def snapshot(self):
+        return {"buckets": dict(zip(self.bounds + ("+Inf",), self.counts)),
+                "count": self.count, "sum": self.sum}
+
+
+class Instrumentation:
+    """
+    Records per-method call counts and latency histograms (operations run
+    by `execute_batch` count under their own names as well), cashbacks
+    refunded during each call, alias-resolution hop counts and balance
+    history sizes of the attached system.
+
+    A cashback counts for the innermost instrumented call it was refunded
+    in, so a batch is not charged again for its operations' refunds.
+    Counters are updated under a lock, so several threads may call the
+    attached system (e.g. a `ConcurrentBankingSystem`).
+    """
+
+    def __init__(self):
+        self.calls = {}  # method -> number of calls
+        self.latency = {}  # method -> Histogram of seconds
+        self.cashbacks = {}  # method -> cashbacks refunded during its calls
+        self.cashbacks_per_call = Histogram(COUNT_BUCKETS)
+        self.alias_hops = Histogram(COUNT_BUCKETS)
+        self.system = None
+        self._lock = threading.Lock()
+        self._local = threading.local()  # refunds: cashbacks in this thread's innermost call
+
+    def attach(self, system):
+        if self.system is not None:
+            raise ValueError("instrumentation is already attached to a system")
+        self.system = system
+        for name in INSTRUMENTED_METHODS:
+            if hasattr(system, name):
+                setattr(system, name, self._timed(name, getattr(system, name)))
+        if hasattr(system, "_batch_handlers"):
+            system._batch_handlers = self._timed_handlers(system._batch_handlers)
+        if hasattr(system, "_refund"):
+            system._refund = self._counted_refund(system._refund)
+        if hasattr(system, "_get_actual_id") and hasattr(system, "aliases"):
+            system._get_actual_id = self._measured_resolution(system._get_actual_id)
+        return self
+
+    def detach(self):
+        for name in INSTRUMENTED_METHODS + ("_batch_handlers", "_refund", "_get_actual_id"):
+            self.system.__dict__.pop(name, None)
+        self.system = None
+
+    def _timed(self, name, method):
+        self.calls.setdefault(name, 0)
+        self.latency.setdefault(name, Histogram(LATENCY_BUCKETS))
+        self.cashbacks.setdefault(name, 0)
+        clock = time.perf_counter
+        local = self._local
+
+        def wrapper(*args, **kwargs):
+            outer = getattr(local, "refunds", 0)
+            local.refunds = 0
+            start = clock()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                elapsed = clock() - start
+                refunded, local.refunds = local.refunds, outer
+                with self._lock:
+                    self.latency[name].observe(elapsed)
+                    self.calls[name] += 1
+                    self.cashbacks[name] += refunded
+                    self.cashbacks_per_call.observe(refunded)
+        return wrapper
+
+    def _timed_handlers(self, batch_handlers):
+        # execute_batch runs the operation bodies directly; time each under
+        # its operation's name too. Handlers that are public methods are
+        # already wrapped.
+        wrapped = vars(self.system)
+
+        def wrapper():
+            return {op: handler if handler is wrapped.get(op) else self._timed(op, handler)
+                    for op, handler in batch_handlers().items()}
+        return wrapper
+
+    def _counted_refund(self, refund):
+        local = self._local
+
+        def wrapper(*args):
+            local.refunds = getattr(local, "refunds", 0) + 1
+            return refund(*args)
+        return wrapper
+
+    def _measured_resolution(self, resolve):
+        parent = self.system.aliases.parent
+
+        def wrapper(account_id):
+            # Hops the union-find walks before path compression shortens them
+            hops, node = 0, account_id
+            while node in parent:
+                node = parent[node]
+                hops += 1
+            with self._lock:
+                self.alias_hops.observe(hops)
+            return resolve(account_id)
+        return wrapper
+
+    def history_sizes(self):
+        history = getattr(self.system, "history_times", None)
+        if history is None:
+            return None
+        sizes = [len(times) for times in history.values()]
+        return {"accounts": len(sizes), "entries": sum(sizes), "max_entries": max(sizes, default=0)}
+
+    def snapshot(self):
+        return {
+            "calls": dict(self.calls),
+            "latency_seconds": {name: histogram.snapshot() for name, histogram in self.latency.items()},
+            "cashbacks_processed": dict(self.cashbacks),
+            "cashbacks_per_call": self.cashbacks_per_call.snapshot(),
+            "alias_hops": self.alias_hops.snapshot(),
+            "history": self.history_sizes(),
+        }
+
+    def prometheus_text(self):
+        lines = [
+            "# HELP banking_calls_total Calls per BankingSystem method.",
+            "# TYPE banking_calls_total counter",
+        ]
+        lines += [f'banking_calls_total{{method="{name}"}} {count}' for name, count in self.calls.items()]
+        lines += [
+            "# HELP banking_call_duration_seconds Latency per BankingSystem method.",
+            "# TYPE banking_call_duration_seconds histogram",
+        ]
+        for name, histogram in self.latency.items():
+            lines += _histogram_lines("banking_call_duration_seconds", histogram, f'method="{name}",')
+        lines += [
+            "# HELP banking_cashbacks_processed_total Cashbacks refunded during calls of each method.",
+            "# TYPE banking_cashbacks_processed_total counter",
+        ]
+        lines += [f'banking_cashbacks_processed_total{{method="{name}"}} {count}'
+                  for name, count in self.cashbacks.items()]
+        lines += [
+            "# HELP banking_cashbacks_per_call Cashbacks refunded per call.",
+            "# TYPE banking_cashbacks_per_call histogram",
+        ]
+        lines += _histogram_lines("banking_cashbacks_per_call", self.cashbacks_per_call)
+        lines += [
+            "# HELP banking_alias_hops Union-find hops per account id resolution.",
+            "# TYPE banking_alias_hops histogram",
+        ]
+        lines += _histogram_lines("banking_alias_hops", self.alias_hops)
+        sizes = self.history_sizes()
+        if sizes is not None:
+            lines += [
+                "# HELP banking_history_entries Balance history entries over all accounts.",
+                "# TYPE banking_history_entries gauge",
+                f"banking_history_entries {sizes['entries']}",
+                "# HELP banking_history_max_entries Longest balance history of one account.",
+                "# TYPE banking_history_max_entries gauge",
+                f"banking_history_max_entries {sizes['max_entries']}",
+            ]
+        return "\n".join(lines) + "\n"
+
+
+def _histogram_lines(metric, histogram, labels=""):
+    lines = []
+    cumulative = 0
+    for bound, count in zip(histogram.bounds + ("+Inf",), histogram.counts):
+        cumulative += count
+        lines.append(f'{metric}_bucket{{{labels}le="{bound}"}} {cumulative}')
+    braces = f"{{{labels.rstrip(',')}}}" if labels else ""
+    lines.append(f"{metric}_sum{braces} {histogram.sum}")
+    lines.append(f"{metric}_count{braces} {histogram.count}")
+    return lines
@@ -0,0 +1,276 @@
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from collections import deque
+import random
+
+
+class SpenderRanking:
+    """
+    Order-statistics index over `(-outgoing, account_id)` keys.
+
+    Keys are kept in a list of sorted buckets (each at most
+    `2 * load` long) plus a list of every bucket's last key, so an
+    update is a binary search over the buckets followed by an insert
+    into one short list, and the top `n` keys are read off the front
+    of the buckets in order.
+
+    `freeze` returns a read-only copy that shares the buckets; a shared
+    bucket is copied before its next change.
+    """
+
+    def __init__(self, load=256):
+        self.load = load
+        self.buckets = []  # sorted lists of (-outgoing, account_id)
+        self.maxes = []  # last key of every bucket
+        self.size = 0
+        self.shared = set()  # ids of buckets a frozen copy may still read
+
+    def __len__(self):
+        return self.size
+
+    def add(self, account_id, outgoing):
+        key = (-outgoing, account_id)
+        self.size += 1
+        if not self.buckets:
+            self.buckets.append([key])
+            self.maxes.append(key)
+            return
+        pos = bisect_left(self.maxes, key)
+        if pos == len(self.maxes):
+            pos -= 1
+            (self._own(pos) if self.shared else self.buckets[pos]).append(key)
+            self.maxes[pos] = key
+        else:
+            insort(self._own(pos) if self.shared else self.buckets[pos], key)
+        if len(self.buckets[pos]) > 2 * self.load:
+            bucket = self.buckets[pos]
+            self.buckets[pos:pos + 1] = [bucket[:self.load], bucket[self.load:]]
+            self.maxes[pos:pos + 1] = [bucket[self.load - 1], bucket[-1]]
+
+    def remove(self, account_id, outgoing):
+        key = (-outgoing, account_id)
+        pos = bisect_left(self.maxes, key)
+        bucket = self._own(pos) if self.shared else self.buckets[pos]
+        del bucket[bisect_left(bucket, key)]
+        self.size -= 1
+        if not bucket:
+            del self.buckets[pos]
+            del self.maxes[pos]
+        else:
+            self.maxes[pos] = bucket[-1]
+
+    def update(self, account_id, old_outgoing, new_outgoing):
+        self.remove(account_id, old_outgoing)
+        self.add(account_id, new_outgoing)
+
+    def merge(self, survivor_id, merged_id, survivor_outgoing, merged_outgoing):
+        # merged_id leaves the ranking and its outgoing moves to survivor_id
+        self.remove(merged_id, merged_outgoing)
+        self.update(survivor_id, survivor_outgoing, survivor_outgoing + merged_outgoing)
+
+    def _own(self, pos):
+        # Bucket pos, copied first if a frozen copy shares it
+        bucket = self.buckets[pos]
+        if id(bucket) in self.shared:
+            self.shared.discard(id(bucket))
+            bucket = self.buckets[pos] = bucket[:]
+        return bucket
+
+    def freeze(self):
+        frozen = SpenderRanking(self.load)
+        frozen.buckets, frozen.maxes, frozen.size = list(self.buckets), list(self.maxes), self.size
+        self.shared = {id(bucket) for bucket in self.buckets}
+        return frozen
+
+    def top(self, n):
+        # [(account_id, outgoing)] for the first n keys
+        result = []
+        for bucket in self.buckets:
+            for neg_outgoing, account_id in bucket:
+                if len(result) >= n:
+                    return result
+                result.append((account_id, -neg_outgoing))
+        return result
+
+
+class WindowedSpenderRanking:
+    """
+    Ranks accounts by what they spent in the last `window` milliseconds.
+
+    Spending is summed into buckets `bucket_width` milliseconds wide, and
+    a bucket is expired as a whole once all of it lies `window` or more
+    before the current time, so a query may include up to
+    `bucket_width - 1` extra milliseconds of older spending
+    (`bucket_width=1` is exact). Only accounts with spending in the
+    window are ranked, and memory is bounded by the number of
+    (bucket, account) pairs inside the window.
+
+    Bucket entries keep the account id they were recorded under and are
+    resolved with `resolve` when they expire, so merged-away ids are
+    charged to their survivor.
+    """
+
+    def __init__(self, window, bucket_width=None, resolve=None):
+        self.window = window
+        self.bucket_width = bucket_width or max(1, window // 64)
+        self.resolve = resolve or (lambda account_id: account_id)
+        self.buckets = deque()  # (bucket number, {account_id: amount}), oldest first
+        self.totals = {}  # account_id -> amount spent in the window
+        self.ranking = SpenderRanking()
+
+    def _change(self, account_id, amount):
+        old = self.totals.get(account_id, 0)
+        new = old + amount
+        if old:
+            self.ranking.remove(account_id, old)
+        if new:
+            self.ranking.add(account_id, new)
+            self.totals[account_id] = new
+        else:
+            self.totals.pop(account_id, None)
+
+    def expire(self, timestamp):
+        horizon = timestamp - self.window  # spending at or before horizon is out of the window
+        width = self.bucket_width
+        while self.buckets and (self.buckets[0][0] + 1) * width - 1 <= horizon:
+            _, amounts = self.buckets.popleft()
+            for account_id, amount in amounts.items():
+                self._change(self.resolve(account_id), -amount)
+
+    def add(self, timestamp, account_id, amount):
+        self.expire(timestamp)
+        number = timestamp // self.bucket_width
+        if not self.buckets or self.buckets[-1][0] != number:
+            self.buckets.append((number, {}))
+        amounts = self.buckets[-1][1]
+        amounts[account_id] = amounts.get(account_id, 0) + amount
+        self._change(account_id, amount)
+
+    def merge(self, survivor_id, merged_id):
+        amount = self.totals.get(merged_id, 0)
+        if amount:
+            self._change(merged_id, -amount)
+            self._change(survivor_id, amount)
+
+    def top(self, timestamp, n):
+        # [(account_id, amount spent in the window)] as of timestamp
+        self.expire(timestamp)
+        return self.ranking.top(n)
+
+
+class PersistentSpenderRanking:
+    """
+    `SpenderRanking` whose past states stay queryable.
+
+    Keys live in a treap of immutable `(key, priority, left, right)`
+    tuples, and every update copies only the O(log A) nodes on its path,
+    so older roots remain valid trees. `commit(timestamp)` records the
+    current root as the version of `timestamp`, and `top_at` reads the
+    first `n` keys of the last version at or before a given time in
+    O(log A + n). Each update keeps about two paths of nodes alive.
+    """
+
+    def __init__(self, seed=0):
+        self.root = None
+        self.size = 0
+        self.random = random.Random(seed)
+        self.version_times = array("q")
+        self.version_roots = []
+
+    def __len__(self):
+        return self.size
+
+    def add(self, account_id, outgoing):
+        self.root = _treap_insert(self.root, (-outgoing, account_id), self.random.random())
+        self.size += 1
+
+    def remove(self, account_id, outgoing):
+        self.root = _treap_delete(self.root, (-outgoing, account_id))
+        self.size -= 1
+
+    def update(self, account_id, old_outgoing, new_outgoing):
+        self.remove(account_id, old_outgoing)
+        self.add(account_id, new_outgoing)
+
+    def merge(self, survivor_id, merged_id, survivor_outgoing, merged_outgoing):
+        # merged_id leaves the ranking and its outgoing moves to survivor_id
+        self.remove(merged_id, merged_outgoing)
+        self.update(survivor_id, survivor_outgoing, survivor_outgoing + merged_outgoing)
+
+    def freeze(self):
+        # Trees are immutable, so a frozen copy just shares the current root
+        frozen = PersistentSpenderRanking()
+        frozen.root, frozen.size = self.root, self.size
+        return frozen
+
+    def commit(self, timestamp):
+        # Later commits at the same timestamp replace its version
+        if self.version_roots and self.version_roots[-1] is self.root:
+            return
+        if self.version_times and self.version_times[-1] == timestamp:
+            self.version_roots[-1] = self.root
+        else:
+            self.version_times.append(timestamp)
+            self.version_roots.append(self.root)
+
+    def top(self, n):
+        return _treap_first(self.root, n)
+
+    def top_at(self, time_at, n):
+        # [(account_id, outgoing)] of the last version committed at or before time_at
+        position = bisect_right(self.version_times, time_at)
+        return _treap_first(self.version_roots[position - 1], n) if position else []
+
+
+def _treap_split(node, key):
+    # -> (nodes with keys < key, nodes with keys >= key), copying the search path
+    if node is None:
+        return None, None
+    node_key, priority, left, right = node
+    if node_key < key:
+        smaller, larger = _treap_split(right, key)
+        return (node_key, priority, left, smaller), larger
+    smaller, larger = _treap_split(left, key)
+    return smaller, (node_key, priority, larger, right)
+
+
+def _treap_join(smaller, larger):
+    if smaller is None:
+        return larger
+    if larger is None:
+        return smaller
+    if smaller[1] > larger[1]:
+        return (smaller[0], smaller[1], smaller[2], _treap_join(smaller[3], larger))
+    return (larger[0], larger[1], _treap_join(smaller, larger[2]), larger[3])
+
+
+def _treap_insert(node, key, priority):
+    if node is None or priority > node[1]:
+        smaller, larger = _treap_split(node, key)
+        return (key, priority, smaller, larger)
+    node_key, node_priority, left, right = node
+    if key < node_key:
+        return (node_key, node_priority, _treap_insert(left, key, priority), right)
+    return (node_key, node_priority, left, _treap_insert(right, key, priority))
+
+
+def _treap_delete(node, key):
+    node_key, priority, left, right = node
+    if key == node_key:
+        return _treap_join(left, right)
+    if key < node_key:
+        return (node_key, priority, _treap_delete(left, key), right)
+    return (node_key, priority, left, _treap_delete(right, key))
+
+
+def _treap_first(node, n):
+    # In-order walk that stops after n keys
+    result, stack = [], []
+    while (stack or node is not None) and len(result) < n:
+        if node is not None:
+            stack.append(node)
+            node = node[2]
+        else:
+            (neg_outgoing, account_id), _, _, node = stack.pop()
+            result.append((account_id, -neg_outgoing))
+    return result
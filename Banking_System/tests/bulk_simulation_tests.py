@@ -0,0 +1,72 @@
+import inspect, os, sys
+current_dir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+from timeout_decorator import timeout
+import random
+import unittest
+import bulk_simulation
+from banking_system_impl import BankingSystemImpl, CASHBACK_DELAY
+from banking_system_time_travel import TimeTravelBankingSystem
+from bulk_simulation import CREATE_ACCOUNT, DEPOSIT, MERGE_ACCOUNTS, PAY, TRANSFER, simulate
+
+
+def state(system):
+    return (system.accounts, dict(system.outgoing), dict(system.history_times), dict(system.history_balances),
+            system.payment_owners, list(system.payment_times), list(system.payment_amounts),
+            bytes(system.payment_statuses), system.ranking.top(len(system.accounts)))
+
+
+class BulkSimulationTests(unittest.TestCase):
+
+    failureException = Exception
+
+    def columns(self, seed, operations=4000, accounts=15):
+        # Random create/deposit/transfer/pay/merge columns that overdraw often
+        rng = random.Random(seed)
+        columns = ops, timestamps, sources, amounts, targets = [], [], [], [], []
+        timestamp = 1
+        for index in range(operations):
+            timestamp += rng.choice([0, 1, 7, 1000, CASHBACK_DELAY // 5])
+            ops.append(rng.choices(range(5), weights=[5 if index < 40 else 0.2, 30, 25, 25, 0.5])[0])
+            timestamps.append(timestamp)
+            sources.append(rng.randrange(accounts))
+            targets.append(rng.randrange(accounts))
+            amounts.append(rng.randint(0, 8000) if ops[-1] == DEPOSIT else rng.randint(0, 3000))
+        return columns, [f'account{index}' for index in range(accounts)]
+
+    def scalar(self, columns, account_ids):
+        system = BankingSystemImpl()
+        for op, timestamp, source, amount, target in zip(*columns):
+            bulk_simulation._call(system, op, timestamp, account_ids[source], account_ids[target], amount)
+        return system
+
+    @timeout(2)
+    def test_matches_the_scalar_engine(self):
+        for seed in range(3):
+            columns, account_ids = self.columns(seed)
+            system = BankingSystemImpl()
+            counts = simulate(system, *columns, account_ids)
+            self.assertEqual(counts['vectorized'] + counts['scalar'], len(columns[0]))
+            self.assertEqual(state(system), state(self.scalar(columns, account_ids)))
+            if bulk_simulation.np is not None:
+                self.assertGreater(counts['vectorized'], counts['scalar'])
+
+    @timeout(2)
+    def test_subclasses_run_every_operation_through_their_bodies(self):
+        columns, account_ids = self.columns(7, operations=1000)
+        system = TimeTravelBankingSystem()
+        self.assertEqual(simulate(system, *columns, account_ids), {'vectorized': 0, 'scalar': 1000})
+        self.assertEqual(state(system), state(self.scalar(columns, account_ids)))
+        # The event log saw every change, so time travel replays to the same state
+        self.assertEqual(system.state_at(columns[1][-1])['accounts'], system.accounts)
+
+    @timeout(0.4)
+    def test_rejects_mismatched_columns(self):
+        with self.assertRaises(ValueError):
+            simulate(BankingSystemImpl(), [CREATE_ACCOUNT, DEPOSIT], [1, 2], [0, 0], [0, 5], [0], ['account0'])
+        if bulk_simulation.np is not None:
+            with self.assertRaises(ValueError):
+                simulate(BankingSystemImpl(), [PAY, TRANSFER, MERGE_ACCOUNTS], [3, 2, 4], [0, 0, 0], [1, 1, 1],
+                         [0, 0, 0], ['account0'])
@@ -0,0 +1,127 @@
+import inspect, os, sys
+current_dir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+from timeout_decorator import timeout
+import random
+import threading
+import unittest
+from banking_system_concurrent import ConcurrentBankingSystem
+from banking_system_impl import BankingSystemImpl, CASHBACK_DELAY
+
+
+def make_streams(threads, accounts, ops, seed):
+    # One command stream per thread over its own accounts; timestamps interleave across threads
+    rng = random.Random(seed)
+    streams = [[] for _ in range(threads)]
+    for timestamp in range(1, threads * ops + 1):
+        thread = rng.randrange(threads)
+        ids = [f'thread{thread}_account{i}' for i in range(accounts)]
+        op = rng.choice(['create_account', 'deposit', 'deposit', 'transfer', 'pay', 'merge_accounts', 'get_balance'])
+        if op == 'create_account':
+            args = (rng.choice(ids),)
+        elif op == 'deposit':
+            args = (rng.choice(ids), rng.randint(1, 1000))
+        elif op in ('transfer', 'merge_accounts'):
+            args = (rng.choice(ids), rng.choice(ids)) + ((rng.randint(1, 500),) if op == 'transfer' else ())
+        elif op == 'pay':
+            args = (rng.choice(ids), rng.randint(1, 500))
+        else:
+            args = (rng.choice(ids), rng.randint(0, timestamp))
+        # large steps so that cashbacks fall due during the run
+        streams[thread].append((op, timestamp * 1000000) + args)
+    return streams
+
+
+class ConcurrentTests(unittest.TestCase):
+
+    failureException = Exception
+
+    @timeout(2)
+    def test_parallel_streams_match_serial_execution(self):
+        streams = make_streams(threads=4, accounts=6, ops=250, seed=3)
+        serial = BankingSystemImpl()
+        expected = {}
+        for command in sorted((c for stream in streams for c in stream), key=lambda c: c[1]):
+            expected[command] = serial.execute_batch([command])[0]
+
+        system = ConcurrentBankingSystem(lock_stripes=8)
+        results = {}
+        def run(stream):
+            for command in stream:
+                results[command] = system.execute_batch([command])[0]
+        workers = [threading.Thread(target=run, args=(stream,)) for stream in streams]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        for command, result in expected.items():
+            if command[0] == 'pay':
+                # payment ordinals depend on how threads interleave
+                self.assertEqual(results[command] is None, result is None)
+            else:
+                self.assertEqual(results[command], result, command)
+        self.assertEqual(system.accounts, serial.accounts)
+        self.assertEqual(system.top_spenders(10 ** 12, 100), serial.top_spenders(10 ** 12, 100))
+        for account_id in serial.accounts:
+            self.assertEqual(system.get_balance(10 ** 15, account_id, 10 ** 15),
+                             serial.get_balance(10 ** 15, account_id, 10 ** 15))
+        self.assertEqual(sorted(system.payment_statuses), sorted(serial.payment_statuses))
+
+    @timeout(0.4)
+    def test_batches_settle_only_the_accounts_they_touch(self):
+        # Batches from different threads arrive out of timestamp order across accounts
+        system = ConcurrentBankingSystem(lock_stripes=8)
+        self.assertEqual(system.execute_batch([
+            ('create_account', 1, 'account1'),
+            ('create_account', 1, 'account2'),
+            ('deposit', 2, 'account2', 1000),
+            ('pay', 3, 'account2', 1000),
+        ]), [True, True, 1000, 'payment1'])
+        self.assertEqual(system.execute_batch([('deposit', 3 * CASHBACK_DELAY, 'account1', 5)]), [5])
+        self.assertEqual(system.execute_batch([('deposit', CASHBACK_DELAY // 2, 'account2', 0)]), [0])
+        self.assertEqual(list(system.history_times['account2']), [1, 2, 3, CASHBACK_DELAY // 2])
+        self.assertEqual(system.execute_batch([('get_payment_status', CASHBACK_DELAY + 3, 'account2', 'payment1'),
+                                               ('get_balance', CASHBACK_DELAY + 3, 'account2', CASHBACK_DELAY + 3)]),
+                         ['CASHBACK_RECEIVED', 20])
+
+    @timeout(2)
+    def test_merges_on_shared_accounts_keep_the_ranking_whole(self):
+        system = ConcurrentBankingSystem(lock_stripes=8)
+        ids = [f'account{i}' for i in range(1000)]
+        system.execute_batch([('create_account', 1, account_id) for account_id in ids] +
+                             [('deposit', 2, account_id, 1000) for account_id in ids] +
+                             [('pay', 3, account_id, 10) for account_id in ids])
+        snapshot = system.snapshot()
+        done = threading.Event()
+        totals = []
+        def spend():
+            # Every merge moves outgoing between accounts, so the total stays put
+            while not done.is_set():
+                totals.append(sum(int(entry.rsplit('(', 1)[1][:-1]) for entry in system.top_spenders(4, 1000)))
+        def merge(seed):
+            rng = random.Random(seed)
+            for _ in range(1000):
+                system.merge_accounts(4, rng.choice(ids), rng.choice(ids))
+        reader = threading.Thread(target=spend)
+        workers = [threading.Thread(target=merge, args=(seed,)) for seed in range(4)]
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)  # switch threads often enough to land inside a merge
+        try:
+            reader.start()
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        finally:
+            done.set()
+            reader.join()
+            sys.setswitchinterval(interval)
+
+        self.assertEqual(set(totals), {10000})
+        self.assertEqual(sum(system.accounts.values()), 1000 * 990)
+        self.assertEqual(len(system.top_spenders(4, 1000)), len(system.accounts))
+        self.assertEqual(snapshot.top_spenders(1000), [f'{account_id}(10)' for account_id in sorted(ids)])
+        self.assertEqual(sum(snapshot.balance(account_id) for account_id in ids), 1000 * 990)
@@ -0,0 +1,83 @@
+import inspect, os, sys
+current_dir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+from timeout_decorator import timeout
+import tempfile
+import unittest
+from banking_system_durable import DurableBankingSystem, WAL_PREFIX
+
+
+class DurableTests(unittest.TestCase):
+
+    failureException = Exception
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.directory = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def populate(self, system):
+        self.assertTrue(system.create_account(1, 'account1'))
+        self.assertTrue(system.create_account(2, 'account2'))
+        self.assertEqual(system.deposit(3, 'account1', 2000), 2000)
+        self.assertEqual(system.deposit(4, 'account2', 1000), 1000)
+        self.assertIsNone(system.transfer(5, 'account2', 'account1', 5000))
+        self.assertEqual(system.pay(6, 'account1', 500), 'payment1')
+        self.assertEqual(system.transfer(7, 'account1', 'account2', 300), 1200)
+        self.assertTrue(system.merge_accounts(8, 'account2', 'account1'))
+
+    def check(self, system):
+        self.assertEqual(system.top_spenders(9, 2), ['account2(800)'])
+        self.assertEqual(system.get_balance(10, 'account1', 6), 1500)
+        self.assertEqual(system.get_payment_status(86400006, 'account2', 'payment1'), 'CASHBACK_RECEIVED')
+        self.assertEqual(system.deposit(86400007, 'account2', 0), 2510)
+        self.assertEqual(system.pay(86400008, 'account2', 10), 'payment2')
+
+    @timeout(0.4)
+    def test_recover_from_log_only(self):
+        system = DurableBankingSystem(self.directory, snapshot_every=1000)
+        self.populate(system)
+        system.close()
+        self.check(DurableBankingSystem(self.directory))
+
+    @timeout(0.4)
+    def test_recover_from_snapshot_and_log_tail(self):
+        system = DurableBankingSystem(self.directory, snapshot_every=3)
+        self.populate(system)
+        system.close()
+        names = sorted(os.listdir(self.directory))
+        self.assertEqual(names, ['snapshot-00000000000000000006.bin', 'wal-00000000000000000006.log'])
+        recovered = DurableBankingSystem(self.directory, snapshot_every=3)
+        self.check(recovered)
+        recovered.close()
+        self.assertEqual(DurableBankingSystem(self.directory).pay(86400009, 'account2', 10), 'payment3')
+
+    @timeout(0.4)
+    def test_torn_log_record_is_discarded(self):
+        system = DurableBankingSystem(self.directory)
+        self.populate(system)
+        system.close()
+        path = os.path.join(self.directory, WAL_PREFIX + '0' * 20 + '.log')
+        with open(path, 'ab') as f:
+            f.write(b'\x40\x00\x00\x00partial')
+        recovered = DurableBankingSystem(self.directory)
+        self.assertEqual(recovered.deposit(9, 'account1', 1), 2501)
+        recovered.close()
+        self.assertEqual(DurableBankingSystem(self.directory).deposit(10, 'account2', 1), 2502)
+
+    @timeout(0.4)
+    def test_checkpoint_with_an_open_snapshot(self):
+        system = DurableBankingSystem(self.directory, snapshot_every=1000)
+        self.populate(system)
+        with system.snapshot() as snapshot:
+            system.checkpoint()
+            self.assertEqual(system.deposit(9, 'account1', 100), 2600)
+            self.assertEqual(snapshot.balance('account1'), 2500)
+        system.close()
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         ['snapshot-00000000000000000007.bin', 'wal-00000000000000000007.log'])
+        self.assertEqual(DurableBankingSystem(self.directory).get_balance(10, 'account1', 9), 2600)
@@ -0,0 +1,106 @@
+import inspect, os, sys
+current_dir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+from timeout_decorator import timeout
+import threading
+import unittest
+from banking_system_concurrent import ConcurrentBankingSystem
+from banking_system_impl import BankingSystemImpl
+from instrumentation import Instrumentation
+
+
+class InstrumentationTests(unittest.TestCase):
+
+    failureException = Exception
+
+    @timeout(0.4)
+    def test_counts_cashbacks_hops_and_history(self):
+        system = BankingSystemImpl()
+        metrics = Instrumentation().attach(system)
+        for i in range(1, 4):
+            self.assertTrue(system.create_account(i, f'account{i}'))
+            self.assertEqual(system.deposit(10 + i, f'account{i}', 1000), 1000)
+        self.assertEqual(system.pay(20, 'account1', 100), 'payment1')
+        self.assertEqual(system.pay(21, 'account1', 100), 'payment2')
+        self.assertEqual(system.get_balance_stats(21, 'account1', 20, 21), (800, 900, 850.0))
+        self.assertTrue(system.merge_accounts(22, 'account2', 'account1'))
+        self.assertTrue(system.merge_accounts(23, 'account3', 'account2'))
+        self.assertEqual(system.deposit(86400030, 'account1', 0), 2804)
+
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot['calls']['deposit'], 4)
+        self.assertEqual(snapshot['calls']['create_account'], 3)
+        self.assertEqual(snapshot['latency_seconds']['pay']['count'], 2)
+        self.assertEqual(snapshot['calls']['get_balance_stats'], 1)
+        self.assertEqual(snapshot['cashbacks_processed']['deposit'], 2)
+        self.assertEqual(snapshot['cashbacks_per_call']['buckets'][2], 1)
+        self.assertGreater(snapshot['alias_hops']['buckets'][1], 0)
+        self.assertEqual(snapshot['history'], {'accounts': 1, 'entries': 13, 'max_entries': 13})
+
+        text = metrics.prometheus_text()
+        self.assertIn('banking_calls_total{method="deposit"} 4\n', text)
+        self.assertIn('banking_call_duration_seconds_count{method="pay"} 2\n', text)
+        self.assertIn('banking_calls_total{method="get_balance_stats"} 1\n', text)
+        self.assertIn('banking_cashbacks_processed_total{method="deposit"} 2\n', text)
+        self.assertIn('banking_history_entries 13\n', text)
+
+        metrics.detach()
+        self.assertNotIn('deposit', vars(system))
+        self.assertEqual(system.deposit(86400031, 'account3', 1), 2805)
+        self.assertEqual(metrics.snapshot()['calls']['deposit'], 4)
+
+    @timeout(0.4)
+    def test_counts_operations_inside_batches(self):
+        for settlement in ('eager', 'lazy'):
+            system = BankingSystemImpl(cashback_settlement=settlement)
+            metrics = Instrumentation().attach(system)
+            self.assertEqual(system.execute_batch([
+                ('create_account', 1, 'account1'),
+                ('deposit', 2, 'account1', 1000),
+                ('pay', 3, 'account1', 100),
+                ('deposit', 4, 'account1', 5),
+                ('get_balance_stats', 5, 'account1', 2, 5),
+            ]), [True, 1000, 'payment1', 905, (900, 1000, 927.5)])
+
+            calls = metrics.snapshot()['calls']
+            self.assertEqual(calls['execute_batch'], 1)
+            self.assertEqual((calls['create_account'], calls['deposit'], calls['pay']), (1, 2, 1))
+            self.assertEqual(calls['get_balance_stats'], 1)
+            self.assertEqual(metrics.latency['deposit'].count, 2)
+            metrics.detach()
+            self.assertNotIn('_batch_handlers', vars(system))
+
+    @timeout(0.4)
+    def test_each_cashback_counts_once(self):
+        expected = {'eager': {'execute_batch': 2, 'deposit': 0}, 'lazy': {'execute_batch': 0, 'deposit': 2}}
+        for settlement, cashbacks in expected.items():
+            system = BankingSystemImpl(cashback_settlement=settlement)
+            metrics = Instrumentation().attach(system)
+            system.execute_batch([('create_account', 1, 'account1'), ('deposit', 2, 'account1', 1000),
+                                  ('pay', 3, 'account1', 100), ('pay', 4, 'account1', 100)])
+            system.execute_batch([('deposit', 86400004, 'account1', 0)])
+            snapshot = metrics.snapshot()
+            self.assertEqual({name: snapshot['cashbacks_processed'][name] for name in cashbacks}, cashbacks)
+            self.assertEqual(snapshot['cashbacks_per_call']['sum'], 2)
+
+    @timeout(2)
+    def test_counters_from_many_threads(self):
+        system = ConcurrentBankingSystem()
+        metrics = Instrumentation().attach(system)
+
+        def run(thread):
+            account_id = f'account{thread}'
+            system.create_account(1, account_id)
+            for timestamp in range(2, 502):
+                system.deposit(timestamp, account_id, 1)
+
+        workers = [threading.Thread(target=run, args=(thread,)) for thread in range(8)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(metrics.calls['deposit'], 4000)
+        self.assertEqual(metrics.latency['deposit'].count, 4000)
+        self.assertEqual(metrics.cashbacks_per_call.count, 4008)
@@ -34,3 +34,167 @@ class SandboxTests(unittest.TestCase):
         self.assertEqual(self.system.deposit(3, 'account1', 2000), 2000)
         self.assertEqual(self.system.deposit(4, 'account2', 1000), 1000)
         self.assertEqual(self.system.transfer(5, 'account1', 'account2', 500), 1500)
+
+    @timeout(0.4)
+    def test_cashback_refunded_only_when_due(self):
+        self.assertTrue(self.system.create_account(1, 'account1'))
+        self.assertEqual(self.system.deposit(2, 'account1', 1000), 1000)
+        self.assertEqual(self.system.pay(3, 'account1', 300), 'payment1')
+        self.assertEqual(self.system.pay(4, 'account1', 200), 'payment2')
+        self.assertEqual(self.system.get_payment_status(86400002, 'account1', 'payment1'), 'IN_PROGRESS')
+        self.assertEqual(self.system.deposit(86400003, 'account1', 0), 506)
+        self.assertEqual(self.system.get_payment_status(86400003, 'account1', 'payment1'), 'CASHBACK_RECEIVED')
+        self.assertEqual(self.system.get_payment_status(86400003, 'account1', 'payment2'), 'IN_PROGRESS')
+        self.assertEqual(self.system.deposit(86400004, 'account1', 0), 510)
+        self.assertEqual(self.system.get_balance(86400005, 'account1', 86400003), 506)
+
+    @timeout(0.4)
+    def test_get_balance_inherits_merged_history(self):
+        self.assertTrue(self.system.create_account(1, 'account1'))
+        self.assertTrue(self.system.create_account(2, 'account2'))
+        self.assertEqual(self.system.deposit(3, 'account1', 100), 100)
+        self.assertEqual(self.system.deposit(4, 'account2', 50), 50)
+        self.assertTrue(self.system.merge_accounts(5, 'account1', 'account2'))
+        self.assertIsNone(self.system.get_balance(6, 'account1', 0))
+        self.assertEqual(self.system.get_balance(6, 'account1', 3), 100)
+        self.assertEqual(self.system.get_balance(6, 'account2', 4), 50)
+        self.assertEqual(self.system.get_balance(6, 'account1', 5), 150)
+
+    @timeout(0.4)
+    def test_merge_chains_resolve_old_aliases(self):
+        for i in range(1, 9):
+            self.assertTrue(self.system.create_account(i, f'account{i}'))
+            self.assertEqual(self.system.deposit(10 + i, f'account{i}', 100), 100)
+        self.assertEqual(self.system.pay(20, 'account8', 50), 'payment1')
+        # merge in waves: 8 -> 7, 6 -> 5, ..., then 7 -> 5, 3 -> 1, then 5 -> 1
+        timestamp = 30
+        for id1, id2 in [(7, 8), (5, 6), (3, 4), (1, 2), (5, 7), (1, 3), (1, 5)]:
+            timestamp += 1
+            self.assertTrue(self.system.merge_accounts(timestamp, f'account{id1}', f'account{id2}'))
+        self.assertFalse(self.system.create_account(40, 'account8'))
+        self.assertEqual(self.system.deposit(41, 'account8', 1), 751)
+        self.assertEqual(self.system.get_payment_status(43, 'account1', 'payment1'), 'IN_PROGRESS')
+        self.assertEqual(self.system.top_spenders(44, 3), ['account1(50)'])
+
+    @timeout(0.4)
+    def test_array_history_backend(self):
+        system = BankingSystemImpl(history_backend='array')
+        self.assertTrue(system.create_account(1, 'account1'))
+        self.assertTrue(system.create_account(2, 'account2'))
+        self.assertEqual(system.deposit(3, 'account2', 300), 300)
+        self.assertEqual(system.deposit(4, 'account1', 100), 100)
+        self.assertEqual(system.deposit(5, 'account2', 50), 350)
+        self.assertTrue(system.merge_accounts(6, 'account1', 'account2'))
+        self.assertEqual(system.get_balance(7, 'account1', 3), 300)
+        self.assertEqual(system.get_balance(7, 'account1', 4), 100)
+        self.assertEqual(system.get_balance(7, 'account2', 6), 450)
+        self.assertIsNone(system.get_balance(7, 'account1', 0))
+
+    @timeout(0.4)
+    def test_execute_batch_matches_individual_calls(self):
+        commands = [
+            ('create_account', 1, 'account1'),
+            ('create_account', 1, 'account2'),
+            ('deposit', 2, 'account1', 1000),
+            ('pay', 3, 'account1', 500),
+            ('transfer', 3, 'account1', 'account2', 100),
+            ('get_payment_status', 86400003, 'account1', 'payment1'),
+            ('merge_accounts', 86400003, 'account2', 'account1'),
+            ('top_spenders', 86400004, 2),
+            ('get_balance', 86400004, 'account1', 86400003),
+        ]
+        expected = [getattr(self.system, op)(timestamp, *args) for op, timestamp, *args in commands]
+        self.assertEqual(expected[5:], ['CASHBACK_RECEIVED', True, ['account2(600)'], 510])
+        self.assertEqual(BankingSystemImpl().execute_batch(iter(commands)), expected)
+
+    @timeout(0.4)
+    def test_get_balance_stats(self):
+        self.assertTrue(self.system.create_account(1, 'account1'))
+        self.assertEqual(self.system.deposit(11, 'account1', 100), 100)
+        self.assertEqual(self.system.deposit(21, 'account1', 50), 150)
+        self.assertEqual(self.system.pay(21, 'account1', 120), 'payment1')
+        self.assertIsNone(self.system.get_balance_stats(22, 'account1', 0, 0))
+        self.assertIsNone(self.system.get_balance_stats(22, 'account1', 5, 4))
+        self.assertEqual(self.system.get_balance_stats(22, 'account1', -10, 10), (0, 0, 0.0))
+        self.assertEqual(self.system.get_balance_stats(22, 'account1', 11, 20), (100, 100, 100.0))
+        minimum, maximum, average = self.system.get_balance_stats(22, 'account1', 1, 30)
+        self.assertEqual((minimum, maximum), (0, 150))
+        self.assertAlmostEqual(average, 1300 / 30)
+
+        self.assertTrue(self.system.create_account(31, 'account2'))
+        self.assertEqual(self.system.deposit(31, 'account2', 1000), 1000)
+        self.assertEqual(self.system.get_balance_stats(32, 'account2', 0, 40), (0, 1000, 1000.0))
+        self.assertTrue(self.system.merge_accounts(41, 'account2', 'account1'))
+        minimum, maximum, average = self.system.get_balance_stats(42, 'account1', 1, 41)
+        self.assertEqual((minimum, maximum), (0, 1030))
+        self.assertAlmostEqual(average, 12330 / 41)
+        self.assertEqual(self.system.deposit(51, 'account2', 10), 1040)
+        minimum, maximum, average = self.system.get_balance_stats(52, 'account2', 41, 51)
+        self.assertEqual((minimum, maximum), (1030, 1040))
+        self.assertAlmostEqual(average, 11340 / 11)
+
+    @timeout(0.4)
+    def test_lazy_cashback_settlement(self):
+        system = BankingSystemImpl(cashback_settlement='lazy')
+        for account_id in ('account1', 'account2', 'account3'):
+            self.assertTrue(system.create_account(1, account_id))
+            self.assertEqual(system.deposit(2, account_id, 1000), 1000)
+        self.assertEqual(system.pay(3, 'account1', 500), 'payment1')
+        self.assertEqual(system.pay(4, 'account2', 100), 'payment2')
+        # operations on other accounts leave the due cashbacks pending
+        self.assertEqual(system.deposit(86400010, 'account3', 1), 1001)
+        self.assertEqual(system.payment_statuses, bytearray([0, 0]))
+        self.assertEqual(system.get_balance(86400011, 'account1', 86400003), 510)
+        self.assertEqual(system.payment_statuses, bytearray([1, 0]))
+        self.assertEqual(system.get_balance(86400011, 'account1', 86400002), 500)
+        self.assertTrue(system.merge_accounts(86400012, 'account3', 'account2'))
+        self.assertEqual(system.get_payment_status(86400013, 'account3', 'payment2'), 'CASHBACK_RECEIVED')
+        self.assertEqual(system.get_balance(86400013, 'account3', 86400004), 902)
+        self.assertEqual(system.get_balance(86400013, 'account3', 86400012), 1903)
+        self.assertEqual(system.pay(86400014, 'account3', 1000), 'payment3')
+        self.assertEqual(system.top_spenders(172800014, 2), ['account3(1100)', 'account1(500)'])
+        self.assertEqual(system.payment_statuses, bytearray([1, 1, 1]))
+        self.assertRaises(ValueError, BankingSystemImpl, cashback_settlement='never')
+
+    @timeout(0.4)
+    def test_out_of_range_payment_changes_nothing(self):
+        system = BankingSystemImpl()
+        self.assertTrue(system.create_account(1, 'account1'))
+        self.assertEqual(system.deposit(2, 'account1', 2 ** 64), 2 ** 64)
+        self.assertRaises(ValueError, system.pay, 3, 'account1', 2 ** 63)
+        self.assertRaises(ValueError, system.pay, 2 ** 63, 'account1', 5)
+        self.assertEqual(system.get_balance(4, 'account1', 4), 2 ** 64)
+        self.assertEqual(system.top_spenders(5, 1), ['account1(0)'])
+        self.assertEqual(system.pay(6, 'account1', 2 ** 63 - 1), 'payment1')
+        self.assertEqual(system.deposit(86400006, 'account1', 0), 2 ** 63 + 1 + (2 ** 63 - 1) * 2 // 100)
+
+    @timeout(0.4)
+    def test_out_of_range_array_history_changes_nothing(self):
+        system = BankingSystemImpl(history_backend='array')
+        self.assertTrue(system.create_account(1, 'account1'))
+        self.assertTrue(system.create_account(1, 'account2'))
+        self.assertRaises(ValueError, system.deposit, 2, 'account1', 2 ** 63)
+        self.assertRaises(ValueError, system.create_account, 2 ** 63, 'account3')
+        self.assertEqual(system.deposit(3, 'account1', 2 ** 63 - 1), 2 ** 63 - 1)
+        self.assertEqual(system.deposit(3, 'account2', 100), 100)
+        self.assertRaises(ValueError, system.transfer, 4, 'account2', 'account1', 1)
+        self.assertRaises(ValueError, system.merge_accounts, 4, 'account1', 'account2')
+        self.assertEqual(system.pay(5, 'account1', 100), 'payment1')
+        self.assertEqual(system.deposit(6, 'account1', 99), 2 ** 63 - 2)
+        # The cashback of 2 would overflow: the refund is rejected whole
+        self.assertRaises(ValueError, system.deposit, 86400005, 'account2', 0)
+        self.assertEqual(system.accounts, {'account1': 2 ** 63 - 2, 'account2': 100})
+        self.assertEqual(list(system.history_times['account1']), [1, 3, 5, 6])
+        self.assertEqual(list(system.history_balances['account1']), [0, 2 ** 63 - 1, 2 ** 63 - 101, 2 ** 63 - 2])
+        self.assertEqual(system.get_balance(5, 'account2', 5), 100)
+        self.assertEqual(system.get_payment_status(86400004, 'account1', 'payment1'), 'IN_PROGRESS')
+
+        lazy = BankingSystemImpl(history_backend='array', cashback_settlement='lazy')
+        self.assertTrue(lazy.create_account(1, 'account1'))
+        self.assertEqual(lazy.deposit(2, 'account1', 2 ** 63 - 1), 2 ** 63 - 1)
+        self.assertEqual(lazy.pay(3, 'account1', 100), 'payment1')
+        self.assertEqual(lazy.deposit(4, 'account1', 99), 2 ** 63 - 2)
+        self.assertRaises(ValueError, lazy.get_balance, 86400003, 'account1', 4)
+        # The refund stays queued rather than being dropped
+        self.assertEqual(len(lazy.account_cashbacks['account1']), 1)
+        self.assertEqual(lazy.get_payment_status(86400003 - 1, 'account1', 'payment1'), 'IN_PROGRESS')
@@ -0,0 +1,139 @@
+import inspect, os, sys
+current_dir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+from timeout_decorator import timeout
+import asyncio
+import json
+import socket
+import unittest
+from banking_client import BankingClient, BankingServerError
+from banking_server import BankingServer
+from banking_system_impl import BankingSystemImpl
+
+
+class UnluckySystem(BankingSystemImpl):
+    # Raises on deposits of 13, as an engine bug would
+
+    def _deposit(self, timestamp, account_id, amount):
+        if amount == 13:
+            raise RuntimeError("unlucky amount")
+        return super()._deposit(timestamp, account_id, amount)
+
+
+class ServerTests(unittest.TestCase):
+
+    failureException = Exception
+
+    def run_with_client(self, scenario, pool_size=2, system=None):
+        async def main():
+            server = BankingServer(system, port=0)
+            await server.start()
+            try:
+                async with await BankingClient.connect(port=server.port, pool_size=pool_size) as client:
+                    return await scenario(client)
+            finally:
+                await server.close()
+        return asyncio.run(main())
+
+    @timeout(2)
+    def test_calls_and_pipelined_batch(self):
+        async def scenario(client):
+            self.assertTrue(await client.create_account(1, 'account1'))
+            self.assertTrue(await client.create_account(2, 'account2'))
+            results = await client.execute_batch([
+                ('deposit', 3, 'account1', 2000),
+                ('deposit', 3, 'account2', 1000),
+                ('transfer', 4, 'account1', 'account2', 500),
+                ('pay', 5, 'account2', 1000),
+                ('get_payment_status', 86400005, 'account2', 'payment1'),
+                ('merge_accounts', 86400006, 'account1', 'account2'),
+                ('top_spenders', 86400007, 2),
+                ('get_balance', 86400008, 'account2', 4),
+            ])
+            self.assertEqual(results, [2000, 1000, 1500, 'payment1', 'CASHBACK_RECEIVED', True,
+                                       ['account1(1500)'], 1500])
+        self.run_with_client(scenario)
+
+    @timeout(2)
+    def test_concurrent_producers_and_bad_requests(self):
+        async def scenario(client):
+            await asyncio.gather(*(client.create_account(1, f'account{i}') for i in range(20)))
+            balances = await asyncio.gather(*(client.deposit(2, f'account{i}', i) for i in range(20)))
+            self.assertEqual(balances, list(range(20)))
+            with self.assertRaises(BankingServerError):
+                await client.call('withdraw', 3, 'account1', 5)
+            with self.assertRaises(BankingServerError):
+                await client.deposit(3, 'account1', '5')
+            self.assertEqual(await client.deposit(4, 'account1', 5), 6)
+        self.run_with_client(scenario, pool_size=4)
+
+    @timeout(2)
+    def test_command_that_raises_fails_alone(self):
+        async def scenario(client):
+            self.assertTrue(await client.create_account(1, 'account1'))
+            self.assertTrue(await client.create_account(1, 'account2'))
+            self.assertEqual(await client.deposit(1, 'account2', 2 ** 63), 2 ** 63)
+            # Pipelined on the one connection, so they reach the engine in order
+            results = await asyncio.gather(
+                client.deposit(2, 'account1', 5),
+                client.deposit(2, 'account1', 13),
+                client.deposit(2, 'account1', 7),
+                client.pay(3, 'account2', 2 ** 63),
+                client.deposit(4, 'account1', 1),
+                return_exceptions=True)
+            self.assertEqual(results[0::2], [5, 12, 13])
+            self.assertIsInstance(results[1], BankingServerError)
+            self.assertIn('unlucky amount', str(results[1]))
+            self.assertIsInstance(results[3], BankingServerError)
+            self.assertIn('64-bit', str(results[3]))
+            # The engine is still serving, and the failed commands changed nothing
+            self.assertEqual(await client.get_balance(5, 'account1', 4), 13)
+            self.assertEqual(await client.get_balance(5, 'account2', 4), 2 ** 63)
+        self.run_with_client(scenario, pool_size=1, system=UnluckySystem())
+
+    def run_with_server(self, scenario):
+        async def main():
+            server = BankingServer(port=0)
+            await server.start()
+            try:
+                return await scenario(server)
+            finally:
+                await server.close()
+        return asyncio.run(main())
+
+    @timeout(2)
+    def test_requests_before_end_of_input_all_get_responses(self):
+        async def scenario(server):
+            server_socket, client_socket = socket.socketpair()
+            _, server_writer = await asyncio.open_connection(sock=server_socket)
+            client_reader, client_writer = await asyncio.open_connection(sock=client_socket)
+            # Every request and the end of input are already buffered, so the
+            # connection reaches EOF before the engine has answered anything
+            reader = asyncio.StreamReader()
+            reader.feed_data(json.dumps({'id': 1, 'op': 'create_account', 'args': [1, 'account1']}).encode() + b'\n')
+            for i in range(2, 101):
+                reader.feed_data(json.dumps({'id': i, 'op': 'deposit', 'args': [2, 'account1', 1]}).encode() + b'\n')
+            reader.feed_eof()
+            await server._serve_connection(reader, server_writer)
+            responses = [json.loads(line) async for line in client_reader]
+            client_writer.close()
+            self.assertEqual(len(responses), 100)
+            self.assertEqual(responses[-1], {'id': 100, 'result': 99})
+        self.run_with_server(scenario)
+
+    @timeout(2)
+    def test_overlong_request_line_gets_an_error(self):
+        async def scenario(server):
+            reader, writer = await asyncio.open_connection('127.0.0.1', server.port)
+            request = {'id': 1, 'op': 'create_account', 'args': [1, 'account' * 20000]}
+            writer.write(json.dumps(request).encode() + b'\n')
+            response = json.loads(await reader.readline())
+            self.assertEqual(response, {'id': None, 'error': 'request line too long'})
+            self.assertEqual(await reader.read(), b'')  # and the server hangs up
+            writer.close()
+            # Other connections are served as before
+            async with await BankingClient.connect(port=server.port, pool_size=1) as client:
+                self.assertTrue(await client.create_account(2, 'account1'))
+        self.run_with_server(scenario)
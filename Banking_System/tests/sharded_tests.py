@@ -0,0 +1,83 @@
+import inspect, os, sys
+current_dir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+from timeout_decorator import timeout
+import random
+import unittest
+from banking_system_impl import BankingSystemImpl
+from banking_system_sharded import ShardedBankingSystem
+
+
+class ShardedTests(unittest.TestCase):
+
+    failureException = Exception
+
+    def setUp(self):
+        self.system = ShardedBankingSystem(workers=3)
+
+    def tearDown(self):
+        self.system.close()
+
+    @timeout(2)
+    def test_cross_shard_operations(self):
+        self.assertTrue(self.system.create_account(1, 'account1'))
+        self.assertTrue(self.system.create_account(2, 'account2'))
+        self.assertTrue(self.system.create_account(3, 'account3'))
+        self.assertEqual(self.system.deposit(4, 'account1', 1000), 1000)
+        self.assertEqual(self.system.deposit(5, 'account2', 500), 500)
+        self.assertEqual(self.system.transfer(6, 'account1', 'account2', 300), 700)
+        self.assertIsNone(self.system.transfer(7, 'account2', 'account3', 5000))
+        self.assertEqual(self.system.pay(8, 'account2', 400), 'payment1')
+        self.assertTrue(self.system.merge_accounts(9, 'account3', 'account2'))
+        self.assertFalse(self.system.create_account(10, 'account2'))
+        self.assertEqual(self.system.get_payment_status(11, 'account3', 'payment1'), 'IN_PROGRESS')
+        self.assertEqual(self.system.deposit(86400008, 'account2', 0), 408)
+        self.assertEqual(self.system.get_payment_status(86400009, 'account3', 'payment1'), 'CASHBACK_RECEIVED')
+        self.assertEqual(self.system.top_spenders(86400010, 2), ['account3(400)', 'account1(300)'])
+        self.assertEqual(self.system.get_balance(86400011, 'account2', 6), 800)
+
+    @timeout(4)
+    def test_batches_match_in_process_engine(self):
+        rng = random.Random(11)
+        ids = [f'account{i}' for i in range(12)]
+        commands, timestamp = [], 0
+        for _ in range(1500):
+            timestamp += rng.choice([0, 1, 7, 30000000])
+            op = rng.choice(['create_account', 'deposit', 'transfer', 'transfer', 'pay', 'pay',
+                             'get_payment_status', 'top_spenders', 'merge_accounts', 'get_balance'])
+            args = {
+                'create_account': lambda: (rng.choice(ids),),
+                'deposit': lambda: (rng.choice(ids), rng.randint(1, 5000)),
+                'transfer': lambda: (rng.choice(ids), rng.choice(ids), rng.randint(1, 3000)),
+                'pay': lambda: (rng.choice(ids), rng.randint(1, 3000)),
+                'get_payment_status': lambda: (rng.choice(ids), f'payment{rng.randint(1, 60)}'),
+                'top_spenders': lambda: (rng.randint(1, 13),),
+                'merge_accounts': lambda: (rng.choice(ids), rng.choice(ids)) if rng.random() < 0.2 else (ids[0], ids[0]),
+                'get_balance': lambda: (rng.choice(ids), rng.randint(0, timestamp)),
+            }[op]()
+            commands.append((op, timestamp) + args)
+        expected = BankingSystemImpl().execute_batch(commands)
+        results = []
+        for start in range(0, len(commands), 100):
+            results += self.system.execute_batch(commands[start:start + 100])
+        self.assertEqual(results, expected)
+
+    @timeout(2)
+    def test_unknown_operation_runs_the_commands_before_it(self):
+        with self.assertRaises(ValueError) as raised:
+            self.system.execute_batch([
+                ('create_account', 1, 'account1'),
+                ('create_account', 1, 'account2'),
+                ('deposit', 2, 'account1', 1000),
+                ('pay', 3, 'account1', 100),
+                ('close_account', 4, 'account2'),
+                ('create_account', 5, 'account3'),
+            ])
+        self.assertEqual(raised.exception.batch_results, [True, True, 1000, 'payment1'])
+        self.assertTrue(self.system.create_account(6, 'account3'))
+        self.assertEqual(self.system.deposit(7, 'account2', 50), 50)
+        self.assertEqual(self.system.get_payment_status(8, 'account1', 'payment1'), 'IN_PROGRESS')
+        self.assertEqual(self.system.top_spenders(9, -1), [])
+        self.assertEqual(self.system.top_spenders(9, 1), ['account1(100)'])
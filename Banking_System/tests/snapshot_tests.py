@@ -0,0 +1,103 @@
+import inspect, os, sys
+current_dir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+from timeout_decorator import timeout
+import threading
+import unittest
+from banking_system_impl import BankingSystemImpl
+
+
+class SnapshotTests(unittest.TestCase):
+
+    failureException = Exception
+
+    @timeout(0.4)
+    def test_snapshot_ignores_later_operations(self):
+        system = BankingSystemImpl()
+        for account_id in ('account1', 'account2'):
+            self.assertTrue(system.create_account(1, account_id))
+            self.assertEqual(system.deposit(2, account_id, 1000), 1000)
+        self.assertEqual(system.pay(3, 'account1', 300), 'payment1')
+
+        with system.snapshot(4) as snapshot:
+            self.assertEqual(system.transfer(5, 'account2', 'account1', 100), 900)
+            self.assertEqual(system.pay(6, 'account2', 50), 'payment2')
+            self.assertTrue(system.create_account(7, 'account3'))
+            self.assertTrue(system.merge_accounts(8, 'account2', 'account1'))
+            self.assertEqual(system.get_payment_status(86400003, 'account2', 'payment1'), 'CASHBACK_RECEIVED')
+
+            self.assertEqual(snapshot.balance('account1'), 700)
+            self.assertEqual(snapshot.balance('account2'), 1000)
+            self.assertIsNone(snapshot.balance('account3'))
+            self.assertEqual(snapshot.get_balance('account1', 2), 1000)
+            self.assertEqual(snapshot.get_balance('account1', 100), 700)
+            self.assertIsNone(snapshot.get_balance('account1', 0))
+            self.assertEqual(snapshot.top_spenders(5), ['account1(300)', 'account2(0)'])
+            self.assertEqual(snapshot.get_payment_status('account1', 'payment1'), 'IN_PROGRESS')
+            self.assertIsNone(snapshot.get_payment_status('account2', 'payment1'))
+            self.assertIsNone(snapshot.get_payment_status('account2', 'payment2'))
+
+        self.assertEqual(system.snapshot().balance('account1'), 1656)
+        self.assertEqual(system.snapshot().balance('account3'), 0)
+        self.assertEqual(system.snapshot().get_payment_status('account1', 'payment2'), 'IN_PROGRESS')
+        # Released and collected snapshots are dropped at the next write
+        self.assertEqual(system.deposit(86400004, 'account3', 10), 10)
+        self.assertEqual(system._snapshots, [])
+
+    @timeout(2)
+    def test_reader_thread_sees_a_consistent_state(self):
+        system = BankingSystemImpl()
+        for index in range(20):
+            system.create_account(1, f'account{index}')
+            system.deposit(1, f'account{index}', 1000)
+        snapshot = system.snapshot()
+        totals = []
+
+        def read():
+            for _ in range(200):
+                totals.append(sum(snapshot.balance(f'account{index}') for index in range(20)))
+
+        reader = threading.Thread(target=read)
+        reader.start()
+        for timestamp in range(2, 2000):
+            system.transfer(timestamp, f'account{timestamp % 20}', f'account{(timestamp * 7) % 20}', 10)
+            if timestamp % 500 == 0:
+                system.merge_accounts(timestamp, f'account{timestamp % 20}', f'account{(timestamp + 1) % 20}')
+        reader.join()
+        self.assertEqual(set(totals), {20000})
+        self.assertEqual(snapshot.top_spenders(1), ['account0(0)'])
+
+    @timeout(0.4)
+    def test_snapshot_shares_aliases_and_statuses(self):
+        system = BankingSystemImpl(cashback_settlement='lazy')
+        for index in range(6):
+            self.assertTrue(system.create_account(1, f'account{index}'))
+            self.assertEqual(system.deposit(2, f'account{index}', 100 * (index + 1)), 100 * (index + 1))
+        self.assertEqual(system.pay(3, 'account4', 100), 'payment1')
+        self.assertEqual(system.pay(3, 'account5', 100), 'payment2')
+        self.assertTrue(system.merge_accounts(4, 'account0', 'account1'))
+        self.assertTrue(system.merge_accounts(4, 'account2', 'account0'))
+
+        snapshot = system.snapshot()
+        self.assertIs(snapshot.aliases, system.aliases)
+        self.assertIs(snapshot.payment_statuses, system.payment_statuses)
+        self.assertTrue(system.merge_accounts(5, 'account3', 'account2'))
+        self.assertTrue(system.merge_accounts(6, 'account4', 'account3'))
+        self.assertTrue(system.create_account(7, 'account6'))
+        self.assertEqual(system.get_payment_status(86400003, 'account4', 'payment1'), 'CASHBACK_RECEIVED')
+        self.assertEqual(system.get_payment_status(86400003, 'account5', 'payment2'), 'CASHBACK_RECEIVED')
+
+        self.assertEqual([snapshot.balance(f'account{index}') for index in range(7)],
+                         [600, 600, 600, 400, 400, 500, None])
+        self.assertEqual(snapshot.get_payment_status('account4', 'payment1'), 'IN_PROGRESS')
+        self.assertIsNone(snapshot.get_payment_status('account1', 'payment1'))
+        self.assertEqual(snapshot.get_payment_status('account5', 'payment2'), 'IN_PROGRESS')
+        self.assertEqual(system.snapshot().balance('account1'), 1402)
+        self.assertEqual(system.snapshot().balance('account6'), 0)
+
+        # Alias paths are compressed again once no snapshot is open
+        snapshot.release()
+        self.assertEqual(system.deposit(86400004, 'account5', 0), 502)
+        self.assertTrue(system.aliases.compress_paths)
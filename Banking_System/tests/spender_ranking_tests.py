@@ -0,0 +1,61 @@
+import inspect, os, sys
+current_dir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+from timeout_decorator import timeout
+import random
+import unittest
+from spender_ranking import PersistentSpenderRanking, SpenderRanking
+
+
+class SpenderRankingTests(unittest.TestCase):
+
+    failureException = Exception
+
+    @timeout(0.4)
+    def test_top_matches_full_sort_across_bucket_splits(self):
+        rng = random.Random(7)
+        ranking = SpenderRanking(load=4)
+        outgoing = {}
+        for step in range(2000):
+            account_id = f"account{rng.randrange(60)}"
+            if account_id not in outgoing:
+                outgoing[account_id] = 0
+                ranking.add(account_id, 0)
+            elif rng.random() < 0.1:
+                ranking.remove(account_id, outgoing.pop(account_id))
+            else:
+                amount = rng.randrange(1, 50)
+                ranking.update(account_id, outgoing[account_id], outgoing[account_id] + amount)
+                outgoing[account_id] += amount
+        expected = sorted(outgoing.items(), key=lambda x: (-x[1], x[0]))
+        self.assertEqual(len(ranking), len(outgoing))
+        self.assertEqual(ranking.top(len(outgoing) + 5), expected)
+        self.assertEqual(ranking.top(7), expected[:7])
+        self.assertEqual(ranking.top(0), [])
+
+    @timeout(1)
+    def test_persistent_versions_keep_past_rankings(self):
+        rng = random.Random(11)
+        ranking = PersistentSpenderRanking()
+        outgoing, expected = {}, {}
+        for timestamp in range(1, 1500):
+            account_id = f"account{rng.randrange(40)}"
+            if account_id not in outgoing:
+                outgoing[account_id] = 0
+                ranking.add(account_id, 0)
+            elif rng.random() < 0.1:
+                ranking.remove(account_id, outgoing.pop(account_id))
+            else:
+                amount = rng.randrange(1, 50)
+                ranking.update(account_id, outgoing[account_id], outgoing[account_id] + amount)
+                outgoing[account_id] += amount
+            ranking.commit(timestamp // 3)
+            expected[timestamp // 3] = sorted(outgoing.items(), key=lambda x: (-x[1], x[0]))
+        self.assertEqual(len(ranking), len(outgoing))
+        self.assertEqual(ranking.top(100), expected[max(expected)])
+        self.assertEqual(ranking.top_at(-1, 5), [])
+        for time_at, ranked in expected.items():
+            self.assertEqual(ranking.top_at(time_at, 100), ranked)
+            self.assertEqual(ranking.top_at(time_at, 3), ranked[:3])
@@ -0,0 +1,103 @@
+import inspect, os, sys
+current_dir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+sys.path.insert(0, current_dir)
+
+from timeout_decorator import timeout
+import tempfile
+import unittest
+from banking_system_sqlite import SqliteBankingSystem
+# Modules, not classes, so the level tests are not collected twice
+# (level_3_tests repeats level 2)
+import level_1_tests, level_2_tests
+
+
+class SqliteSystemMixin:
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'bank.db')
+        self.system = SqliteBankingSystem(self.path)
+
+    def tearDown(self):
+        self.system.close()
+        self.tmp.cleanup()
+
+
+class SqliteLevel1Tests(SqliteSystemMixin, level_1_tests.Level1Tests):
+    pass
+
+
+class SqliteLevel2Tests(SqliteSystemMixin, level_2_tests.Level2Tests):
+    pass
+
+
+class SqliteTests(SqliteSystemMixin, unittest.TestCase):
+
+    failureException = Exception
+
+    @timeout(0.4)
+    def test_reopen_continues_from_the_database(self):
+        self.assertTrue(self.system.create_account(1, 'account1'))
+        self.assertTrue(self.system.create_account(2, 'account2'))
+        self.assertEqual(self.system.deposit(3, 'account1', 2000), 2000)
+        self.assertEqual(self.system.pay(4, 'account1', 500), 'payment1')
+        self.assertEqual(self.system.transfer(5, 'account1', 'account2', 300), 1200)
+        self.assertTrue(self.system.merge_accounts(6, 'account2', 'account1'))
+        self.system.close()
+
+        self.system = SqliteBankingSystem(self.path, cache_size=2)
+        self.assertEqual(self.system.top_spenders(7, 2), ['account2(800)'])
+        self.assertEqual(self.system.get_balance(8, 'account1', 5), 1200)
+        self.assertEqual(self.system.get_payment_status(86400004, 'account1', 'payment1'), 'CASHBACK_RECEIVED')
+        self.assertEqual(self.system.deposit(86400005, 'account2', 0), 1510)
+        self.assertEqual(self.system.pay(86400006, 'account1', 10), 'payment2')
+
+    @timeout(0.4)
+    def test_execute_batch(self):
+        results = self.system.execute_batch([
+            ('create_account', 1, 'account1'),
+            ('deposit', 2, 'account1', 100),
+            ('get_balance_stats', 3, 'account1', 1, 2),
+        ])
+        self.assertEqual(results, [True, 100, (0, 100, 50.0)])
+        self.assertRaises(ValueError, self.system.execute_batch, [('close', 4)])
+
+    @timeout(0.4)
+    def test_out_of_range_values_change_nothing(self):
+        system = self.system
+        self.assertTrue(system.create_account(1, 'account1'))
+        self.assertTrue(system.create_account(1, 'account2'))
+        self.assertEqual(system.deposit(2, 'account1', 2 ** 63 - 1), 2 ** 63 - 1)
+        self.assertRaises(ValueError, system.deposit, 3, 'account1', 1)
+        self.assertEqual(system.deposit(3, 'account2', 10), 10)
+        self.assertRaises(ValueError, system.transfer, 4, 'account2', 'account1', 5)
+        self.assertRaises(ValueError, system.merge_accounts, 4, 'account1', 'account2')
+        self.assertRaises(ValueError, system.create_account, 2 ** 63, 'account3')
+        self.assertEqual(system.get_balance(5, 'account1', 5), 2 ** 63 - 1)
+        self.assertEqual(system.get_balance(5, 'account2', 5), 10)
+        self.assertEqual(system.top_spenders(6, -1), [])
+        self.assertEqual(system.top_spenders(6, 1), ['account1(0)'])
+
+    @timeout(2)
+    def test_merges_into_a_growing_account(self):
+        system = self.system
+        self.assertTrue(system.create_account(1, 'hub0'))
+        for index in range(1, 300):
+            self.assertTrue(system.create_account(2, f'hub{index}'))
+            self.assertEqual(system.deposit(3, f'hub{index}', 1), 1)
+            # The new account survives, so the hub's aliases move every time
+            # unless the smaller group moves instead
+            self.assertTrue(system.merge_accounts(4, f'hub{index}', f'hub{index - 1}'))
+        self.assertEqual(system.get_balance(5, 'hub0', 5), 299)
+        self.assertEqual(system.get_balance(5, 'hub150', 5), 299)
+        self.assertEqual(system.connection.execute('SELECT count(*) FROM alias_groups').fetchone()[0], 1)
+        system.close()
+        self.system = SqliteBankingSystem(self.path)
+        self.assertEqual(self.system.get_balance(6, 'hub17', 6), 299)
+        self.assertFalse(self.system.create_account(7, 'hub0'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import inspect, os, sys
+current_dir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+from timeout_decorator import timeout
+import random
+import unittest
+from banking_system_impl import BankingSystemImpl, PAYMENT_STATUSES
+from banking_system_time_travel import TimeTravelBankingSystem
+
+
+class TimeTravelTests(unittest.TestCase):
+
+    failureException = Exception
+
+    def populate(self, system):
+        self.assertTrue(system.create_account(1, 'account1'))
+        self.assertTrue(system.create_account(2, 'account2'))
+        self.assertEqual(system.deposit(3, 'account1', 2000), 2000)
+        self.assertEqual(system.deposit(4, 'account2', 1000), 1000)
+        self.assertIsNone(system.transfer(5, 'account2', 'account1', 5000))
+        self.assertEqual(system.pay(6, 'account1', 500), 'payment1')
+        self.assertEqual(system.transfer(7, 'account1', 'account2', 300), 1200)
+        self.assertTrue(system.merge_accounts(8, 'account2', 'account1'))
+        self.assertEqual(system.deposit(86400010, 'account1', 5), 2515)
+
+    @timeout(0.4)
+    def test_state_at(self):
+        for checkpoint_every in (1, 2, 1000):
+            system = TimeTravelBankingSystem(checkpoint_every=checkpoint_every)
+            self.populate(system)
+            self.assertEqual(system.state_at(0), {'accounts': {}, 'outgoing': {}, 'payments': {}})
+            self.assertEqual(system.state_at(6), {
+                'accounts': {'account1': 1500, 'account2': 1000},
+                'outgoing': {'account1': 500, 'account2': 0},
+                'payments': {'payment1': 'IN_PROGRESS'},
+            })
+            self.assertEqual(system.state_at(8), {
+                'accounts': {'account2': 2500},
+                'outgoing': {'account2': 800},
+                'payments': {'payment1': 'IN_PROGRESS'},
+            })
+            # the cashback of payment1 goes to the account it was merged into
+            self.assertEqual(system.state_at(86400006), {
+                'accounts': {'account2': 2510},
+                'outgoing': {'account2': 800},
+                'payments': {'payment1': 'CASHBACK_RECEIVED'},
+            })
+            self.assertEqual(system.state_at(86400010)['accounts'], {'account2': 2515})
+
+    @timeout(0.4)
+    def test_top_spenders_at(self):
+        system = TimeTravelBankingSystem()
+        self.populate(system)
+        self.assertTrue(system.create_account(86400011, 'account3'))
+        self.assertEqual(system.top_spenders_at(86400012, 3, 0), [])
+        self.assertEqual(system.top_spenders_at(86400012, 3, 5), ['account1(0)', 'account2(0)'])
+        self.assertEqual(system.top_spenders_at(86400012, 3, 7), ['account1(800)', 'account2(0)'])
+        self.assertEqual(system.top_spenders_at(86400012, 3, 86400010), ['account2(800)'])
+        self.assertEqual(system.top_spenders_at(86400012, 3, 86400011), ['account2(800)', 'account3(0)'])
+        self.assertEqual(system.execute_batch([('top_spenders_at', 86400013, 1, 6)]), [['account1(500)']])
+
+    @timeout(2)
+    def test_state_at_matches_replay(self):
+        rng = random.Random(3)
+        ids = [f'account{i}' for i in range(6)]
+        commands, timestamp = [], 0
+        for _ in range(300):
+            timestamp += rng.choice([0, 1, 5, 1000, 40000000])
+            op = rng.choice(['create_account', 'deposit', 'transfer', 'pay', 'merge_accounts', 'get_balance'])
+            args = {
+                'create_account': lambda: (rng.choice(ids),),
+                'deposit': lambda: (rng.choice(ids), rng.randint(1, 5000)),
+                'transfer': lambda: (rng.choice(ids), rng.choice(ids), rng.randint(1, 3000)),
+                'pay': lambda: (rng.choice(ids), rng.randint(1, 3000)),
+                'merge_accounts': lambda: (rng.choice(ids), rng.choice(ids)),
+                'get_balance': lambda: (rng.choice(ids), rng.randint(0, timestamp)),
+            }[op]()
+            commands.append((op, timestamp, *args))
+        system = TimeTravelBankingSystem(checkpoint_every=7)
+        system.execute_batch(commands)
+
+        for time_at in sorted(rng.sample([command[1] for command in commands], 10)):
+            replay = BankingSystemImpl()
+            replay.execute_batch([command for command in commands if command[1] <= time_at])
+            replay._process_cashbacks(time_at)
+            self.assertEqual(system.state_at(time_at), {
+                'accounts': replay.accounts,
+                'outgoing': {account_id: replay.outgoing[account_id] for account_id in replay.accounts},
+                'payments': {f'payment{index + 1}': PAYMENT_STATUSES[status]
+                             for index, status in enumerate(replay.payment_statuses)},
+            })
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import inspect, os, sys
+current_dir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+from timeout_decorator import timeout
+import tempfile
+import unittest
+from banking_system_impl import BankingSystemImpl
+from benchmarks.replay import replay
+from benchmarks.workload import generate
+from trace_recorder import TraceError, TraceRecorder, read_trace
+
+
+class TraceTests(unittest.TestCase):
+
+    failureException = Exception
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'calls.trace')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    @timeout(0.4)
+    def test_records_calls_results_and_errors(self):
+        system = BankingSystemImpl()
+        recorder = TraceRecorder(self.path).attach(system)
+        self.assertTrue(system.create_account(1, 'account1'))
+        self.assertEqual(system.deposit(2, 'account1', 500), 500)
+        self.assertEqual(system.pay(3, 'account1', 100), 'payment1')
+        self.assertEqual(system.execute_batch(iter([('create_account', 4, 'account2'),
+                                                    ('top_spenders', 5, 2)])),
+                         [True, ['account1(100)', 'account2(0)']])
+        self.assertEqual(system.get_balance_stats(6, 'account1', 0, 6), (0, 500, 350.0))
+        with self.assertRaises(ValueError):
+            system.execute_batch([('close_account', 7, 'account1')])
+        recorder.close()
+        self.assertNotIn('deposit', vars(system))
+
+        self.assertEqual(list(read_trace(self.path)), [
+            ('create_account', 1, ('account1',), True),
+            ('deposit', 2, ('account1', 500), 500),
+            ('pay', 3, ('account1', 100), 'payment1'),
+            ('execute_batch', 4, ([('create_account', 4, 'account2'), ('top_spenders', 5, 2)],),
+             [True, ['account1(100)', 'account2(0)']]),
+            ('get_balance_stats', 6, ('account1', 0, 6), (0, 500, 350.0)),
+            ('execute_batch', 7, ([('close_account', 7, 'account1')],),
+             TraceError('ValueError', "unknown operation: 'close_account'")),
+        ])
+
+    @timeout(0.4)
+    def test_unencodable_call_is_skipped_not_failed(self):
+        class Amount(int):
+            # An int subclass, like numpy.int64, that the trace does not encode
+            pass
+
+        system = BankingSystemImpl()
+        recorder = TraceRecorder(self.path).attach(system)
+        self.assertTrue(system.create_account(1, 'account1'))
+        self.assertEqual(system.deposit(2, 'account1', Amount(500)), 500)
+        # The skipped record must not leave its new string behind either
+        self.assertIsNone(system.deposit(2, 'account2', Amount(5)))
+        self.assertIsNone(system.get_balance(3, 'account2', 2))
+        self.assertEqual(system.deposit(4, 'account1', 5), 505)
+        recorder.close()
+        self.assertEqual((recorder.records, recorder.skipped), (3, 2))
+        self.assertEqual(list(read_trace(self.path)), [
+            ('create_account', 1, ('account1',), True),
+            ('get_balance', 3, ('account2', 2), None),
+            ('deposit', 4, ('account1', 5), 505),
+        ])
+
+    @timeout(2)
+    def test_replay_verifies_a_recorded_workload(self):
+        system = BankingSystemImpl()
+        recorder = TraceRecorder(self.path).attach(system)
+        for op, timestamp, *args in generate(accounts=50, operations=3000, pending_cashbacks=50, seed=2):
+            getattr(system, op)(timestamp, *args)
+        recorder.close()
+        self.assertEqual(recorder.records, 3100)
+
+        # Cut the last record in half, as a crash mid-write would
+        with open(self.path, 'r+b') as f:
+            f.truncate(os.path.getsize(self.path) - 2)
+        stats, mismatches = replay(BankingSystemImpl(), read_trace(self.path), chunk=1000)
+        self.assertEqual(mismatches, [])
+        self.assertEqual(sum(count for count, _ in stats.values()), 3099)
+
+        stats, mismatches = replay(BankingSystemImpl(history_backend='array'), read_trace(self.path))
+        self.assertEqual(mismatches, [])
+        # A different engine behaviour shows up as mismatches
+        records = [(op, timestamp, args, 'other' if op == 'pay' else result)
+                   for op, timestamp, args, result in read_trace(self.path)]
+        _, mismatches = replay(BankingSystemImpl(), records)
+        self.assertEqual({mismatch[1] for mismatch in mismatches}, {'pay'})
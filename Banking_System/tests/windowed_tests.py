@@ -0,0 +1,51 @@
+import inspect, os, sys
+current_dir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+from timeout_decorator import timeout
+import unittest
+from banking_system_windowed import WindowedBankingSystem
+
+
+class WindowedTests(unittest.TestCase):
+
+    failureException = Exception
+
+    @timeout(0.4)
+    def test_spending_leaves_the_window(self):
+        system = WindowedBankingSystem(window=100, bucket_width=1)
+        for account_id in ('account1', 'account2', 'account3'):
+            self.assertTrue(system.create_account(1, account_id))
+            self.assertEqual(system.deposit(2, account_id, 1000), 1000)
+        self.assertEqual(system.transfer(10, 'account1', 'account2', 300), 700)
+        self.assertEqual(system.pay(50, 'account2', 200), 'payment1')
+        self.assertEqual(system.pay(60, 'account1', 50), 'payment2')
+        self.assertIsNone(system.pay(70, 'account3', 5000))
+        self.assertEqual(system.top_spenders_in_window(100, 5), ['account1(350)', 'account2(200)'])
+        self.assertEqual(system.top_spenders_in_window(109, 1), ['account1(350)'])
+        self.assertEqual(system.top_spenders_in_window(110, 5), ['account2(200)', 'account1(50)'])
+        self.assertEqual(system.top_spenders_in_window(160, 5), [])
+        self.assertEqual(system.top_spenders(161, 3), ['account1(350)', 'account2(200)', 'account3(0)'])
+
+    @timeout(0.4)
+    def test_merged_spending_counts_for_the_survivor(self):
+        system = WindowedBankingSystem(window=100, bucket_width=10)
+        for account_id in ('account1', 'account2', 'account3'):
+            self.assertTrue(system.create_account(1, account_id))
+            self.assertEqual(system.deposit(2, account_id, 1000), 1000)
+        self.assertEqual(system.pay(10, 'account1', 100), 'payment1')
+        self.assertEqual(system.pay(30, 'account2', 70), 'payment2')
+        self.assertEqual(system.pay(30, 'account3', 120), 'payment3')
+        self.assertTrue(system.merge_accounts(40, 'account2', 'account1'))
+        self.assertEqual(system.top_spenders_in_window(50, 5), ['account2(170)', 'account3(120)'])
+        # spending through the merged-away id is charged to the survivor
+        self.assertEqual(system.pay(60, 'account1', 40), 'payment4')
+        self.assertEqual(system.execute_batch([('top_spenders_in_window', 70, 1)]), [['account2(210)']])
+        # the bucket [10, 20) expires as a whole once it is 100 ms old
+        self.assertEqual(system.top_spenders_in_window(119, 5), ['account3(120)', 'account2(110)'])
+        self.assertEqual(system.top_spenders_in_window(139, 5), ['account2(40)'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,29 @@
+import inspect, os, sys
+current_dir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+from timeout_decorator import timeout
+import unittest
+from banking_system_impl import BankingSystemImpl
+from benchmarks.workload import generate
+
+
+class WorkloadTests(unittest.TestCase):
+
+    failureException = Exception
+
+    @timeout(2)
+    def test_generate_is_seeded_and_replays_identically(self):
+        commands = list(generate(accounts=50, operations=3000, merge_chain_depth=3, pending_cashbacks=50, seed=5))
+        self.assertEqual(commands, list(generate(accounts=50, operations=3000, merge_chain_depth=3,
+                                                 pending_cashbacks=50, seed=5)))
+        self.assertEqual(len(commands), 2 * 50 + 3000)
+        self.assertEqual([c[1] for c in commands], sorted(c[1] for c in commands))
+
+        system = BankingSystemImpl()
+        results = [getattr(system, op)(timestamp, *args) for op, timestamp, *args in commands]
+        self.assertEqual(BankingSystemImpl().execute_batch(commands), results)
+        # the workload exercises successful merges and received cashbacks
+        self.assertIn(True, [r for c, r in zip(commands, results) if c[0] == 'merge_accounts'])
+        self.assertIn('CASHBACK_RECEIVED', results)
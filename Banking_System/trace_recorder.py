@@ -0,0 +1,340 @@
+"""
+Opt-in call tracing for `BankingSystem` implementations.
+
+    recorder = TraceRecorder("calls.trace").attach(system)
+    ...
+    recorder.close()  # detaches and flushes
+    for op, timestamp, args, result in read_trace("calls.trace"):
+        ...
+
+Like `Instrumentation`, attaching wraps the methods of one instance, so
+systems that are not traced pay nothing. `benchmarks.replay` feeds a
+trace into any engine and checks its results.
+
+A trace is `TRACE_MAGIC` followed by one record per call: the method
+name, the timestamp as a zigzag varint delta from the previous record,
+the argument count, the arguments and the result. Values are tagged;
+strings are sent once and then referred to by index, and payment ids
+and `top_spenders` entries are packed as numbers, so a call of the
+synthetic workload takes about 21 bytes.
+"""
+import struct
+import threading
+
+from banking_system_impl import parse_payment_id
+
+TRACE_MAGIC = b"BANKTRACE1\n"
+TRACED_METHODS = (
+    "create_account", "deposit", "transfer", "top_spenders", "pay", "get_payment_status",
+    "merge_accounts", "get_balance", "get_balance_stats", "execute_batch",
+)
+BUFFER_BYTES = 1 << 16  # buffered bytes written out at once
+READ_BYTES = 1 << 20
+
+# Value tags
+NONE, FALSE, TRUE, INT, STRING, NEW_STRING, PAYMENT, SPENDER, LIST, TUPLE, FLOAT, ERROR = range(12)
+DOUBLE = struct.Struct("<d")
+
+
+class TraceError:
+    """
+    The result of a traced call that raised: the exception class name
+    and message.
+    """
+
+    __slots__ = ("name", "message")
+
+    def __init__(self, name, message):
+        self.name, self.message = name, message
+
+    def __eq__(self, other):
+        return isinstance(other, TraceError) and (self.name, self.message) == (other.name, other.message)
+
+    def __repr__(self):
+        return f"TraceError({self.name!r}, {self.message!r})"
+
+
+def _varint(out, n):
+    while n >= 0x80:
+        out.append(n & 0x7F | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _zigzag(n):
+    return n << 1 if n >= 0 else (-n << 1) - 1
+
+
+class TraceWriter:
+    # Encodes records into a buffer that is written out every BUFFER_BYTES
+
+    def __init__(self, path):
+        self.file = open(path, "wb")
+        self.file.write(TRACE_MAGIC)
+        self.buffer = bytearray()
+        self.strings = {}  # string -> index, in order of first use
+        self.timestamp = 0
+
+    def write(self, op, timestamp, args, result):
+        out = self.buffer
+        start, strings = len(out), len(self.strings)
+        try:
+            self._value(out, op)
+            _varint(out, _zigzag(timestamp - self.timestamp))
+            _varint(out, len(args))
+            for arg in args:
+                self._value(out, arg)
+            self._value(out, result)
+        except TypeError:
+            # Drop the partial record and the strings it introduced
+            del out[start:]
+            for value in list(self.strings)[strings:]:
+                del self.strings[value]
+            raise
+        self.timestamp = timestamp
+        if len(out) >= BUFFER_BYTES:
+            self.flush()
+
+    def _value(self, out, value):
+        if value is None:
+            out.append(NONE)
+        elif value is True or value is False:
+            out.append(TRUE if value else FALSE)
+        elif type(value) is int:
+            out.append(INT)
+            _varint(out, _zigzag(value))
+        elif type(value) is str:
+            self._string(out, value)
+        elif type(value) is list or type(value) is tuple:
+            out.append(LIST if type(value) is list else TUPLE)
+            _varint(out, len(value))
+            for item in value:
+                self._value(out, item)
+        elif type(value) is float:
+            out.append(FLOAT)
+            out += DOUBLE.pack(value)
+        elif type(value) is TraceError:
+            out.append(ERROR)
+            self._string(out, value.name)
+            self._string(out, value.message)
+        else:
+            raise TypeError(f"cannot trace a value of type {type(value).__name__}")
+
+    def _string(self, out, value):
+        index = self.strings.get(value)
+        if index is not None:
+            out.append(STRING)
+            _varint(out, index)
+            return
+        # "payment<n>" and "<account_id>(<amount>)" are packed as numbers
+        payment = parse_payment_id(value)
+        if payment is not None:
+            out.append(PAYMENT)
+            _varint(out, payment)
+            return
+        if value.endswith(")"):
+            account_id, _, amount = value[:-1].rpartition("(")
+            if amount.isascii() and amount.isdigit() and str(int(amount)) == amount and "(" not in account_id:
+                out.append(SPENDER)
+                self._string(out, account_id)
+                _varint(out, int(amount))
+                return
+        self.strings[value] = len(self.strings)
+        data = value.encode()
+        out.append(NEW_STRING)
+        _varint(out, len(data))
+        out += data
+
+    def flush(self):
+        self.file.write(self.buffer)
+        self.buffer.clear()
+        self.file.flush()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+class TraceRecorder:
+    """
+    Streams every call to the traced methods of the attached system, with
+    its result, to a trace file. Only the outermost call of a thread is
+    recorded, so the calls `execute_batch` makes itself are not. A call
+    with a value the trace cannot encode (say a NumPy integer) is counted
+    in `skipped` instead; recording never changes the call's outcome.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.writer = None
+        self.system = None
+        self.records = 0
+        self.skipped = 0
+        self._lock = threading.Lock()
+        self._active = threading.local()
+
+    def attach(self, system):
+        if self.system is not None:
+            raise ValueError("recorder is already attached to a system")
+        self.system = system
+        self.writer = TraceWriter(self.path)
+        for name in TRACED_METHODS:
+            if hasattr(system, name):
+                method = getattr(system, name)
+                if name == "execute_batch":
+                    setattr(system, name, self._recorded_batch(method))
+                else:
+                    setattr(system, name, self._recorded(name, method))
+        return self
+
+    def detach(self):
+        for name in TRACED_METHODS:
+            self.system.__dict__.pop(name, None)
+        self.system = None
+
+    def close(self):
+        if self.system is not None:
+            self.detach()
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    def _recorded(self, name, method):
+        active = self._active
+
+        def wrapper(timestamp, *args):
+            if getattr(active, "calling", False):
+                return method(timestamp, *args)
+            active.calling = True
+            try:
+                result = method(timestamp, *args)
+            except Exception as error:
+                self._write(name, timestamp, args, TraceError(type(error).__name__, str(error)))
+                raise
+            finally:
+                active.calling = False
+            self._write(name, timestamp, args, result)
+            return result
+        return wrapper
+
+    def _recorded_batch(self, method):
+        # A batch is one record: the first command's timestamp, and the
+        # commands (read into a list, they may be an iterator) as its argument
+        recorded = self._recorded("execute_batch", lambda timestamp, commands: method(commands))
+
+        def wrapper(commands):
+            commands = [tuple(command) for command in commands]
+            return recorded(commands[0][1] if commands else 0, commands)
+        return wrapper
+
+    def _write(self, name, timestamp, args, result):
+        with self._lock:
+            if self.writer is not None:
+                try:
+                    self.writer.write(name, timestamp, args, result)
+                except TypeError:
+                    self.skipped += 1
+                    return
+                self.records += 1
+
+
+def read_trace(path):
+    """
+    Yields the `(op, timestamp, args, result)` records of a trace. A
+    record torn at the end of the file (the process died mid-write) is
+    dropped, like a torn write-ahead log record.
+    """
+    with open(path, "rb") as f:
+        if f.read(len(TRACE_MAGIC)) != TRACE_MAGIC:
+            raise ValueError(f"not a banking trace: {path}")
+        reader = _TraceReader()
+        data = b""
+        while True:
+            chunk = f.read(READ_BYTES)
+            data = data[reader.offset:] + chunk
+            reader.data, reader.offset = data, 0
+            while True:
+                start, strings = reader.offset, len(reader.strings)
+                try:
+                    record = reader.record()
+                except IndexError:
+                    # Incomplete record: forget its strings and read more
+                    reader.offset = start
+                    del reader.strings[strings:]
+                    break
+                yield record
+            if not chunk:
+                return
+
+
+class _TraceReader:
+    # Decodes records from self.data starting at self.offset
+
+    def __init__(self):
+        self.data = b""
+        self.offset = 0
+        self.strings = []
+        self.timestamp = 0
+
+    def record(self):
+        op = self.value()
+        timestamp = self.timestamp + self.signed()
+        args = tuple(self.value() for _ in range(self.varint()))
+        result = self.value()
+        self.timestamp = timestamp
+        return op, timestamp, args, result
+
+    def varint(self):
+        data, offset = self.data, self.offset
+        byte = data[offset]
+        n, shift = byte & 0x7F, 7
+        while byte & 0x80:
+            offset += 1
+            byte = data[offset]
+            n |= (byte & 0x7F) << shift
+            shift += 7
+        self.offset = offset + 1
+        return n
+
+    def signed(self):
+        n = self.varint()
+        return n >> 1 if not n & 1 else -((n + 1) >> 1)
+
+    def value(self):
+        tag = self.data[self.offset]
+        self.offset += 1
+        if tag == STRING:
+            return self.strings[self.varint()]
+        if tag == INT:
+            return self.signed()
+        if tag == NONE:
+            return None
+        if tag == TRUE or tag == FALSE:
+            return tag == TRUE
+        if tag == NEW_STRING:
+            length = self.varint()
+            end = self.offset + length
+            if end > len(self.data):
+                raise IndexError("string runs past the end of the data")
+            value = self.data[self.offset:end].decode()
+            self.offset = end
+            self.strings.append(value)
+            return value
+        if tag == PAYMENT:
+            return f"payment{self.varint() + 1}"
+        if tag == SPENDER:
+            account_id = self.value()
+            return f"{account_id}({self.varint()})"
+        if tag == LIST or tag == TUPLE:
+            items = [self.value() for _ in range(self.varint())]
+            return items if tag == LIST else tuple(items)
+        if tag == FLOAT:
+            end = self.offset + DOUBLE.size
+            if end > len(self.data):
+                raise IndexError("float runs past the end of the data")
+            (value,) = DOUBLE.unpack_from(self.data, self.offset)
+            self.offset = end
+            return value
+        if tag == ERROR:
+            return TraceError(self.value(), self.value())
+        raise ValueError(f"corrupt trace: unknown value tag {tag}")